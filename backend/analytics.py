@@ -0,0 +1,198 @@
+"""Per-card performance counters for balance analytics.
+
+Every resolved drive is folded into in-memory counters for the cards played in
+it. A background thread flushes the accumulated increments into the card_stats
+and card_tag_stats tables of the catalog database with additive upserts, so
+several worker processes can flush into the same totals. Reads combine the
+flushed totals with this process's pending increments, so they are always
+current without scanning session history. The flush thread starts with the
+first recorded drive, and whatever is pending is flushed at exit.
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background flushes
+FLUSH_INTERVAL = 10.0
+
+# Counter columns of card_stats, in the order CardStats keeps them
+COUNTERS = ('plays', 'successes', 'turnovers', 'score_total', 'score_share_total', 'yards_total')
+
+CARD_STATS_UPSERT = f'''
+    INSERT INTO card_stats (card_type, card_id, {", ".join(COUNTERS)}) VALUES (?, ?, {", ".join("?" for _ in COUNTERS)})
+    ON CONFLICT (card_type, card_id) DO UPDATE SET {", ".join(f"{c} = {c} + excluded.{c}" for c in COUNTERS)}
+'''
+TAG_STATS_UPSERT = '''
+    INSERT INTO card_tag_stats (card_type, card_id, tag, drives) VALUES (?, ?, ?, ?)
+    ON CONFLICT (card_type, card_id, tag) DO UPDATE SET drives = drives + excluded.drives
+'''
+
+def create_stats_tables(cursor):
+    """Create the analytics tables in the catalog database"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_stats (
+            card_type TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            plays INTEGER DEFAULT 0,
+            successes INTEGER DEFAULT 0,
+            turnovers INTEGER DEFAULT 0,
+            score_total INTEGER DEFAULT 0,  -- drive scores of every drive the card was in
+            score_share_total REAL DEFAULT 0,  -- each drive's score split evenly over its cards
+            yards_total INTEGER DEFAULT 0,
+            PRIMARY KEY (card_type, card_id)
+        )
+    ''')
+    # How often each synergy tag was on another card in the same drive
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_tag_stats (
+            card_type TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            drives INTEGER DEFAULT 0,
+            PRIMARY KEY (card_type, card_id, tag)
+        )
+    ''')
+
+class CardStats:
+    """Pending per-card increments for one process, flushed to the database periodically"""
+
+    def __init__(self, database: str):
+        self.database = database
+        # Guards the pending increments; only ever held briefly, since record_drive takes it on the request path
+        self.lock = threading.Lock()
+        # Held across a flush's write and a read of the stored totals, so a read never sees increments both
+        # stored and pending
+        self._flush_lock = threading.Lock()
+        self._counters: Dict[tuple, List[float]] = {}
+        self._tags: Dict[tuple, Counter] = {}
+        self.pending_drives = 0
+        self.flushed_at = None
+        self._flusher = None
+
+    def record_drive(self, cards: List[dict], result: dict):
+        """Fold one resolved drive into the counters of the (catalog) cards played in it"""
+        if not cards:
+            return
+        share = result['drive_score'] / len(cards)
+        increments = (1, 1 if result['drive_successful'] else 0, 1 if result['turnover'] else 0,
+                      result['drive_score'], share, result['yards_gained'])
+        tags = [set(card.get('synergy_tags') or ()) for card in cards]
+
+        with self.lock:
+            for position, card in enumerate(cards):
+                key = (card['type'], card['id'])
+                counters = self._counters.setdefault(key, [0] * len(COUNTERS))
+                for index, value in enumerate(increments):
+                    counters[index] += value
+                # Tags of the other cards, counted once per drive
+                others = set().union(*(tags[other] for other in range(len(cards)) if other != position))
+                if others:
+                    self._tags.setdefault(key, Counter()).update(others)
+            self.pending_drives += 1
+            if self._flusher is None:
+                self._flusher = self.start()
+
+    def flush(self):
+        """Add the pending increments to the stored totals"""
+        with self._flush_lock:
+            # Swap the increments out, so drives recorded during the write start a new batch
+            with self.lock:
+                if not self._counters:
+                    return 0
+                counters, tags, drives = self._counters, self._tags, self.pending_drives
+                self._counters, self._tags, self.pending_drives = {}, {}, 0
+            try:
+                conn = storage.connect(self.database, timeout=30)
+                try:
+                    conn.executemany(CARD_STATS_UPSERT, [(*key, *values) for key, values in counters.items()])
+                    conn.executemany(TAG_STATS_UPSERT, [(*key, tag, count) for key, tag_counts in tags.items()
+                                                        for tag, count in tag_counts.items()])
+                    conn.commit()
+                finally:
+                    conn.close()
+            except BaseException:
+                # Put the batch back to be retried with the next flush
+                self._merge(counters, tags, drives)
+                raise
+            self.flushed_at = time.time()
+        return drives
+
+    def _merge(self, counters: Dict[tuple, List[float]], tags: Dict[tuple, Counter], drives: int):
+        with self.lock:
+            for key, values in counters.items():
+                pending = self._counters.setdefault(key, [0] * len(COUNTERS))
+                for index, value in enumerate(values):
+                    pending[index] += value
+            for key, tag_counts in tags.items():
+                self._tags.setdefault(key, Counter()).update(tag_counts)
+            self.pending_drives += drives
+
+    def start(self, interval: float = FLUSH_INTERVAL) -> threading.Thread:
+        """Flush in a background thread every interval seconds"""
+        def run():
+            while True:
+                stop.wait(interval)
+                try:
+                    self.flush()
+                except sqlite3.Error:
+                    logger.exception('Card stats flush failed, will retry')
+        stop = threading.Event()
+        thread = threading.Thread(target=run, name='card-stats-flusher', daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+        return thread
+
+    def totals(self, card_type: Optional[str] = None) -> Dict[tuple, dict]:
+        """Stored totals plus this process's pending increments, keyed by (card type, catalog id)"""
+        where, params = ('WHERE card_type = ?', (card_type,)) if card_type else ('', ())
+        totals = {}
+
+        def entry(key):
+            return totals.setdefault(key, {'counters': [0] * len(COUNTERS), 'tags': Counter()})
+
+        with self._flush_lock:
+            conn = storage.connect(self.database)
+            try:
+                for row in conn.execute(f'SELECT card_type, card_id, {", ".join(COUNTERS)} FROM card_stats {where}',
+                                        params):
+                    entry(row[:2])['counters'] = list(row[2:])
+                for key_type, card_id, tag, drives in conn.execute(
+                        f'SELECT card_type, card_id, tag, drives FROM card_tag_stats {where}', params):
+                    entry((key_type, card_id))['tags'][tag] += drives
+            finally:
+                conn.close()
+
+            with self.lock:
+                for key, values in self._counters.items():
+                    if card_type and key[0] != card_type:
+                        continue
+                    stored = entry(key)
+                    stored['counters'] = [total + pending for total, pending in zip(stored['counters'], values)]
+                    stored['tags'].update(self._tags.get(key, ()))
+        return totals
+
+def card_summary(key: tuple, entry: dict, top_tags: int = 5) -> dict:
+    """Render one card's totals as rates and averages for the API"""
+    values = dict(zip(COUNTERS, entry['counters']))
+    plays = values['plays']
+    return {
+        'type': key[0],
+        'id': key[1],
+        'plays': plays,
+        'successes': values['successes'],
+        'turnovers': values['turnovers'],
+        'success_rate': round(values['successes'] / plays, 4) if plays else None,
+        'turnover_rate': round(values['turnovers'] / plays, 4) if plays else None,
+        'avg_drive_score': round(values['score_total'] / plays, 2) if plays else None,
+        'avg_score_share': round(values['score_share_total'] / plays, 2) if plays else None,
+        'avg_yards': round(values['yards_total'] / plays, 2) if plays else None,
+        'top_tags': dict(entry['tags'].most_common(top_tags)),
+    }
@@ -0,0 +1,166 @@
+"""Server-side fast-forward: resolve a session's drives without client round trips.
+
+auto_play runs the same steps a client would, in memory: fill the hand from the
+session's draw pile, let a card-selection policy pick the drive, score it, and
+apply the play_drive progression rules. The session's rng stream is consumed
+exactly as the draw-cards and play-drive endpoints would consume it, so
+auto-played drives replay like any others.
+
+A policy takes the hand (hydrated cards), the game state and the catalog's
+SynergyMatrix (or None) and returns the cards to play, in order. Policies are
+registered in POLICIES by name.
+
+auto_play_loaded runs auto_play on a session loaded from a SessionRepository (see
+sessions.py) and applies the run to it, for the auto-play endpoint and for
+auto_play_stored, which saves the run, for playing games outside the API.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog import Catalog
+from deck import DrawPile
+from replay import drive_payload
+from scoring import advance_downs, advance_progress, calculate_drive_score, expected_drive_score, session_rng
+from sessions import GameSession, SessionRepository, progress_views
+from snapshot import SessionSnapshot
+from synergy import SynergyMatrix
+
+# Cards the hand is filled to before each drive, as the client does
+AUTO_PLAY_HAND_SIZE = 5
+
+def greedy_policy(hand: List[dict], game_state: dict, synergy: Optional[SynergyMatrix] = None) -> List[dict]:
+    """Grow the drive one card at a time, always adding the card that gives the highest expected score,
+    and play the best drive seen along the way"""
+    drive, remaining = [], list(hand)
+    best, best_score = [], 0.0
+    while remaining:
+        scores = [expected_drive_score(drive + [card], game_state, synergy) for card in remaining]
+        choice = max(range(len(remaining)), key=scores.__getitem__)
+        drive.append(remaining.pop(choice))
+        if scores[choice] > best_score:
+            best, best_score = list(drive), scores[choice]
+    # Nothing in hand can score - cycle the whole hand through the discard pile
+    return best or drive
+
+def whole_hand_policy(hand: List[dict], game_state: dict, synergy: Optional[SynergyMatrix] = None) -> List[dict]:
+    """Play every card in hand, in the order drawn"""
+    return list(hand)
+
+Policy = Callable[[List[dict], dict, Optional[SynergyMatrix]], List[dict]]
+
+POLICIES: Dict[str, Policy] = {
+    'greedy': greedy_policy,
+    'whole_hand': whole_hand_policy,
+}
+
+class AutoPlay:
+    """The outcome of auto-playing a session, ready to be written back in one transaction"""
+
+    def __init__(self, pile: DrawPile, progress: dict, situation: tuple, rng_step: int):
+        self.pile = pile
+        self.progress = progress
+        self.situation = situation
+        self.rng_step = rng_step
+        # (rng_step, cards, hand refs, game state, result) of each drive, for session_actions
+        self.actions = []
+        self.drives = []
+        self.score = 0
+        self.stopped = None
+
+    def delta_ops(self, session: GameSession) -> List[dict]:
+        """The delta ops of this run once applied to its session"""
+        game_progress, season_progress, _ = progress_views(session.progress)
+        return self.pile.ops + [
+            {'op': 'inc', 'values': {'score': self.score}},
+            {'op': 'set', 'values': {
+                'game': session.progress['current_game'],
+                'drive': session.progress['current_drive'],
+                'downs': session.downs,
+                'distance': session.distance,
+                'yards_to_go': session.yards_to_go,
+                'game_progress': game_progress,
+                'season_progress': season_progress
+            }}
+        ]
+
+    def replay_actions(self) -> List[tuple]:
+        """Each drive as a (rng step, action, payload) session_actions entry, so replay.py can re-score it"""
+        return [(step, 'drive', drive_payload([card.to_dict() for card in cards], hand, game_state, result))
+                for step, cards, hand, game_state, result in self.actions]
+
+def auto_play(pile: DrawPile, progress: dict, situation: tuple, rng_seed, rng_step: int, hydrate,
+              policy: Policy, until: str, max_drives: int, synergy: Optional[SynergyMatrix] = None,
+              on_drive: Optional[Callable[[List[dict], dict], None]] = None) -> AutoPlay:
+    """Play drives until the current game (until='game') or season (until='season') is over, the
+    session runs out of cards, or max_drives have been played. hydrate turns packed hand refs into
+    cards, synergy is the session catalog's SynergyMatrix, and on_drive is called with each drive's
+    cards and result."""
+    run = AutoPlay(pile, progress, situation, rng_step)
+    finished = ('games_won', 'seasons_won') if until == 'game' else ('seasons_won',)
+    start = [progress[key] for key in finished]
+
+    while len(run.drives) < max_drives:
+        # Fill the hand; a reshuffle moves the rng stream on, as in draw-cards
+        pile.rng = session_rng(rng_seed, run.rng_step)
+        reshuffles = pile.reshuffles
+        pile.draw(AUTO_PLAY_HAND_SIZE - pile.hand_size())
+        if pile.reshuffles != reshuffles:
+            run.rng_step += 1
+
+        hand_refs = pile.hand_refs()
+        if not hand_refs:
+            run.stopped = 'out_of_cards'
+            break
+        game_state = {'season': progress['current_season'], 'game': progress['current_game']}
+        cards = policy(hydrate(hand_refs), game_state, synergy)
+
+        result = calculate_drive_score(cards, game_state, session_rng(rng_seed, run.rng_step), synergy)
+        # Logged as scored, before the downs rules can turn it into a turnover
+        run.actions.append((run.rng_step, cards, [ref[:2] for ref in hand_refs], game_state, dict(result)))
+        pile.discard_from_hand([(card['type'], card['id'], card.get('instance_id')) for card in cards])
+        run.situation = advance_downs(run.situation, result)
+        advance_progress(progress, result['drive_successful'])
+        run.rng_step += 1
+
+        run.score += result['drive_score']
+        run.drives.append({
+            'cards': [card.get('instance_id') for card in cards],
+            'drive_score': result['drive_score'],
+            'drive_successful': result['drive_successful'],
+            'turnover': result['turnover'],
+            'yards_gained': result['yards_gained'],
+        })
+        if on_drive:
+            on_drive(cards, result)
+        if [progress[key] for key in finished] != start:
+            run.stopped = f'{until}_complete'
+            break
+    else:
+        run.stopped = 'max_drives'
+    return run
+
+def auto_play_loaded(session: GameSession, catalog: Catalog, policy: Policy, until: str, max_drives: int,
+                     on_drive: Optional[Callable[[List[dict], dict], None]] = None) -> Tuple[AutoPlay, SessionSnapshot]:
+    """auto_play a loaded session against its catalog version and apply the run to it, returning the run and the
+    snapshot the session started from"""
+    snapshot = SessionSnapshot(session.snapshot, catalog.get)
+    run = auto_play(DrawPile.from_snapshot(snapshot, None), session.progress, session.situation, session.rng_seed,
+                    session.rng_step, snapshot.hydrate, policy, until, max_drives,
+                    synergy=catalog.indexes.get('synergy'), on_drive=on_drive)
+
+    session.snapshot = snapshot.replace_packed(**run.pile.zones())
+    session.situation = run.situation
+    session.rng_step = run.rng_step
+    session.score += run.score
+    return run, snapshot
+
+def auto_play_stored(repository: SessionRepository, session_id: int, catalog: Catalog, policy: Policy, until: str,
+                     max_drives: int) -> Optional[AutoPlay]:
+    """auto_play a stored session against its catalog version, then save the run with its drives logged for
+    replay, as the auto-play endpoint does. None if there is no such session."""
+    with repository.transaction(session_id) as sessions:
+        session = sessions.load(session_id)
+        if session is None:
+            return None
+        run, _ = auto_play_loaded(session, catalog, policy, until, max_drives)
+        sessions.save(session, run.delta_ops(session), run.replay_actions())
+    return run
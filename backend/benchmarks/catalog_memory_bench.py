@@ -0,0 +1,87 @@
+"""Compare per-worker memory for private vs memory-mapped card catalogs.
+
+Each worker process loads the catalog, serves a burst of random card lookups
+and reports its private (unshared) memory, as a WSGI worker would. Linux only:
+reads /proc/self/smaps_rollup.
+
+Usage (from backend/):
+    python benchmarks/catalog_memory_bench.py [--catalog cards.json] [--workers 1,4,8] [--scale 50]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CARD_TYPES, catalog_from_definitions, load_card_definitions
+from shared_catalog import MappedCatalog, catalog_file_path, write_catalog_file
+
+def scale_definitions(definitions, scale):
+    """Grow the catalog for measurement by copying each card under fresh ids"""
+    scaled = {}
+    for table, cards in definitions.items():
+        top = max(card['id'] for card in cards)
+        scaled[table] = [dict(card, id=card['id'] + copy * top) for copy in range(scale) for card in cards]
+    return scaled
+
+def private_kb():
+    """Private clean + dirty memory of this process in kB"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total
+
+def worker(mode, source, lookups, results):
+    before = private_kb()
+    if mode == 'private':
+        definitions, version = load_card_definitions(source)
+        catalog = catalog_from_definitions(definitions, version)
+    else:
+        catalog = MappedCatalog(source)
+    refs = [(card_type, card_id) for card_type in CARD_TYPES for card_id in catalog.ids_of_type(card_type)]
+    rng = random.Random(os.getpid())
+    for _ in range(lookups):
+        catalog.get(*rng.choice(refs))
+    results.put(private_kb() - before)
+
+def run(mode, source, workers, lookups):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(mode, source, lookups, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    growth = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(growth)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', default='cards.json')
+    parser.add_argument('--workers', default='1,4,8')
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--scale', type=int, default=1, help='repeat every card this many times under new ids')
+    args = parser.parse_args()
+
+    definitions, _ = load_card_definitions(args.catalog)
+    definitions = scale_definitions(definitions, args.scale)
+    catalog = catalog_from_definitions(definitions)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'cards.json')
+        with open(source, 'w') as f:
+            json.dump(definitions, f)
+        shared_path = catalog_file_path(directory, catalog.version)
+        write_catalog_file(catalog, shared_path, {})
+        print(f'{len(catalog.cards)} cards, mapped file {os.path.getsize(shared_path)} B')
+        for workers in (int(count) for count in args.workers.split(',')):
+            private = run('private', source, workers, args.lookups)
+            mapped = run('mapped', shared_path, workers, args.lookups)
+            print(f'{workers:>3} workers  private catalog +{private:>7} kB   mapped catalog +{mapped:>7} kB')
+
+if __name__ == '__main__':
+    main()
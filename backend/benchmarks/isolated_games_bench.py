@@ -0,0 +1,117 @@
+"""Play many isolated games in-process on each session storage backend.
+
+    dict     DictSessionRepository - sessions in Python dicts
+    memory   SQLiteSessionRepository on a shared-cache in-memory database
+    file     SQLiteSessionRepository on a database file in a temporary directory
+
+Each backend starts empty, deals every game's deck from the same seeds and
+auto-plays it through autoplay.auto_play_stored until the game (or season) is
+over, so all backends must end with identical sessions; the script checks that
+and exits 1 if they don't.
+
+Usage (from backend/):
+    python benchmarks/isolated_games_bench.py [--games 2000] [--backends dict,memory,file] [--until game]
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from app import DECK_CONFIGS, build_deck_templates, init_session_tables
+from autoplay import POLICIES, auto_play_stored
+from catalog import catalog_from_definitions, load_card_definitions
+from scoring import session_rng
+from sessions import DictSessionRepository, SESSION_FIELDS, SQLiteSessionRepository
+from shards import ShardRouter
+from snapshot import encode_packed_zones
+from synergy import build_synergy_matrix
+
+def sqlite_repository(database, shard_count):
+    router = ShardRouter(database, shard_count)
+    for path in router.shard_paths():
+        conn = storage.connect(path)
+        init_session_tables(conn.cursor())
+        conn.commit()
+        conn.close()
+    return SQLiteSessionRepository(router)
+
+def run(repository, catalog, games, seed, policy, until):
+    """Create and auto-play games sessions, returning (drives played, digest of every final session)"""
+    # A generator of its own, since sharded repositories draw session ids from random
+    rng = random.Random(seed)
+    deck_types = sorted(DECK_CONFIGS)
+    digest = hashlib.sha1()
+    drives = 0
+    for index in range(games):
+        # Dealt as start_game deals it
+        deck_type = deck_types[index % len(deck_types)]
+        rng_seed = rng.getrandbits(63)
+        template = catalog.indexes['decks'][deck_type]
+        snapshot = encode_packed_zones({'deck_cards': template.deal(session_rng(rng_seed, 0)),
+                                        'hand': b'', 'bench': b'', 'field': b'', 'discard_pile': b''})
+        session = repository.create(f'Player {index}', DECK_CONFIGS[deck_type], deck_type, snapshot, rng_seed,
+                                    catalog.version)
+        drives += len(auto_play_stored(repository, session.id, catalog, policy, until, 200).drives)
+
+        session = repository.load(session.id)
+        digest.update(repr([getattr(session, field) for field in SESSION_FIELDS]
+                           + sorted(session.progress.items())).encode())
+    return drives, digest.hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', default='cards.json')
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--backends', default='dict,memory,file')
+    parser.add_argument('--shards', type=int, default=1, help='session shards of the SQLite backends')
+    parser.add_argument('--policy', default='whole_hand', choices=sorted(POLICIES))
+    parser.add_argument('--until', default='game', choices=('game', 'season'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    definitions, version = load_card_definitions(args.catalog)
+    catalog = catalog_from_definitions(definitions, version)
+    build_deck_templates(catalog)
+    build_synergy_matrix(catalog)
+
+    results = []
+    for backend in args.backends.split(','):
+        directory = None
+        if backend == 'dict':
+            repository = DictSessionRepository()
+        elif backend == 'memory':
+            repository = sqlite_repository(f'{storage.MEMORY_PREFIX}isolated-games', args.shards)
+        elif backend == 'file':
+            directory = tempfile.mkdtemp()
+            repository = sqlite_repository(os.path.join(directory, 'games.db'), args.shards)
+        else:
+            parser.error(f'unknown backend {backend}')
+
+        started = time.perf_counter()
+        drives, digest = run(repository, catalog, args.games, args.seed, POLICIES[args.policy], args.until)
+        elapsed = time.perf_counter() - started
+        results.append((backend, drives, elapsed, digest))
+        if directory:
+            shutil.rmtree(directory)
+        elif backend == 'memory':
+            for path in repository.router.shard_paths():
+                storage.drop(path)
+
+    print(f'{args.games} games until the {args.until} is over, {args.policy} policy')
+    print(f"{'backend':<8} {'drives':>8} {'seconds':>8} {'games/s':>9} {'drives/s':>9}")
+    for backend, drives, elapsed, digest in results:
+        print(f'{backend:<8} {drives:>8} {elapsed:>8.2f} {args.games / elapsed:>9.0f} {drives / elapsed:>9.0f}')
+    if len({digest for *_, digest in results}) > 1:
+        print('Final sessions differ between backends')
+        sys.exit(1)
+    print('Final sessions match across backends')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""Play full game sessions concurrently against a local backend and report capacity.
+
+Each virtual player loops through the real client flow: start game, mulligan,
+draw, play-drive, shop, buy, draft. The number of active players follows a ramp
+profile of "players:seconds" stages.
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --ramp 5:20,20:30,50:30 --report load_report.json
+
+Unless --base-url is given, app.py is started on a scratch copy of the database
+and stopped afterwards, with the dev server or, with --server production, the
+production server (tuned by the WEB_* variables, see serve.py).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DECK_TYPES = ('balanced_offense', 'air_raid', 'ground_and_pound', 'trick_plays')
+
+def parse_ramp(profile):
+    """Parse '5:20,20:30' into [(5, 20.0), (20, 30.0)]"""
+    stages = []
+    for stage in profile.split(','):
+        players, seconds = stage.split(':')
+        stages.append((int(players), float(seconds)))
+    return stages
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Stats:
+    """Thread-safe latency and error counters per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_timeouts = defaultdict(int)
+        self.sessions = 0
+        self.drives = 0
+
+    def record(self, endpoint, seconds, status, body):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            # 400s are expected game outcomes (not enough points, no draft yet)
+            if status >= 500 or status == 0:
+                self.errors[endpoint] += 1
+                if b'database is locked' in body:
+                    self.lock_timeouts[endpoint] += 1
+
+    def total_requests(self):
+        with self.lock:
+            return sum(len(values) for values in self.latencies.values())
+
+class VirtualPlayer(threading.Thread):
+    """One simulated player running game loops until told to stop"""
+
+    def __init__(self, base_url, stats, stop_event, rng, timeout):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.stats = stats
+        self.stop_event = stop_event
+        self.rng = rng
+        self.timeout = timeout
+
+    def call(self, endpoint, method, path, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            status, body = 0, str(e).encode('utf-8')
+        self.stats.record(endpoint, time.perf_counter() - started, status, body)
+        if status == 200:
+            return json.loads(body)
+        return None
+
+    def play_session(self):
+        game = self.call('start', 'POST', '/api/game/start',
+                         {'player_name': self.name, 'deck_type': self.rng.choice(DECK_TYPES)})
+        if not game:
+            return
+        session = f"/api/game/{game['session_id']}"
+        with self.stats.lock:
+            self.stats.sessions += 1
+
+        for _ in range(self.rng.randint(3, 8)):
+            if self.stop_event.is_set():
+                return
+            result = self.call('mulligan', 'POST', f'{session}/mulligan', {})
+            hand = result['hand'] if result else []
+            result = self.call('draw-cards', 'POST', f'{session}/draw-cards', {'num_cards': 2})
+            if result:
+                hand = result['hand']
+            if hand:
+                cards = self.rng.sample(hand, min(len(hand), self.rng.randint(2, 4)))
+                if self.call('play-drive', 'POST', f'{session}/play-drive', {'cards': cards}):
+                    with self.stats.lock:
+                        self.stats.drives += 1
+
+            shop = self.call('shop', 'GET', f'{session}/shop')
+            if shop and shop['shop_cards']:
+                affordable = [card for card in shop['shop_cards'] if card['data']['cost'] <= shop['coaching_points']]
+                card = self.rng.choice(affordable or shop['shop_cards'])
+                self.call('buy-card', 'POST', f'{session}/buy-card', {'card': card})
+
+            draft = self.call('draft-reward', 'GET', f'{session}/draft-reward')
+            if draft and draft['draft_cards']:
+                self.call('select-draft-card', 'POST', f'{session}/select-draft-card',
+                          {'card': self.rng.choice(draft['draft_cards'])})
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.play_session()
+
+def database_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal', '-journal') if os.path.exists(path + suffix))
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/api/ready', timeout=1).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Backend at {base_url} did not come up')
+
+def start_backend(port, database, server='dev'):
+    """Start app.py on a scratch database and wait until it answers"""
+    env = dict(os.environ, DATABASE_PATH=database, PORT=str(port),
+               SERVER_MODE='production' if server == 'production' else 'dev')
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'app.py')], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_server(f'http://127.0.0.1:{port}')
+    return process
+
+def run_load(base_url, stages, seed, timeout):
+    """Run the ramp profile and return raw stats plus per-stage throughput"""
+    stats = Stats()
+    rng = random.Random(seed)
+    players = []
+    stage_reports = []
+    started = time.perf_counter()
+
+    for target, seconds in stages:
+        # Grow or shrink the active player pool to this stage's size
+        while len(players) < target:
+            stop_event = threading.Event()
+            player = VirtualPlayer(base_url, stats, stop_event, random.Random(rng.random()), timeout)
+            player.name = f'load-{len(players)}'
+            player.start()
+            players.append((player, stop_event))
+        while len(players) > target:
+            players.pop()[1].set()
+
+        before = stats.total_requests()
+        time.sleep(seconds)
+        after = stats.total_requests()
+        stage_reports.append({'players': target, 'seconds': seconds, 'requests': after - before,
+                              'throughput_rps': round((after - before) / seconds, 1)})
+        print(f'{target:>4} players  {(after - before) / seconds:>8.1f} req/s', flush=True)
+
+    for player, stop_event in players:
+        stop_event.set()
+    for player, _ in players:
+        player.join(timeout)
+    return stats, stage_reports, time.perf_counter() - started
+
+def build_report(stats, stage_reports, elapsed, db_before, db_after):
+    endpoints = {}
+    total_requests = 0
+    for endpoint, values in sorted(stats.latencies.items()):
+        values = sorted(values)
+        total_requests += len(values)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': stats.errors[endpoint],
+            'lock_timeouts': stats.lock_timeouts[endpoint],
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p90_ms': round(percentile(values, 0.90) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    all_latencies = sorted(value for values in stats.latencies.values() for value in values)
+    errors = sum(stats.errors.values())
+    lock_timeouts = sum(stats.lock_timeouts.values())
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 1) if elapsed else 0,
+        'sessions_started': stats.sessions,
+        'drives_played': stats.drives,
+        'error_rate': round(errors / total_requests, 4) if total_requests else 0,
+        'lock_timeout_rate': round(lock_timeouts / total_requests, 4) if total_requests else 0,
+        'latency_ms': {
+            'p50': round(percentile(all_latencies, 0.50) * 1000, 2) if all_latencies else None,
+            'p90': round(percentile(all_latencies, 0.90) * 1000, 2) if all_latencies else None,
+            'p99': round(percentile(all_latencies, 0.99) * 1000, 2) if all_latencies else None,
+        },
+        'db_bytes_before': db_before,
+        'db_bytes_after': db_after,
+        'db_growth_bytes': db_after - db_before if None not in (db_before, db_after) else None,
+        'stages': stage_reports,
+        'endpoints': endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ramp', default='5:15,20:15,50:15', help='comma-separated players:seconds stages')
+    parser.add_argument('--base-url', help='target an already running backend instead of starting one')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'fantasy_football.db'),
+                        help='database to copy for the scratch backend (or to measure with --base-url)')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--server', choices=('dev', 'production'), default='dev',
+                        help='server mode for the scratch backend')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default='load_report.json')
+    args = parser.parse_args()
+
+    stages = parse_ramp(args.ramp)
+    process = None
+    scratch_dir = None
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+        database = args.database
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix='ffr-load-')
+        database = os.path.join(scratch_dir, 'fantasy_football.db')
+        shutil.copy(args.database, database)
+        base_url = f'http://127.0.0.1:{args.port}'
+        process = start_backend(args.port, database, args.server)
+
+    try:
+        db_before = database_size(database) if os.path.exists(database) else None
+        stats, stage_reports, elapsed = run_load(base_url, stages, args.seed, args.timeout)
+        db_after = database_size(database) if os.path.exists(database) else None
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    report = build_report(stats, stage_reports, elapsed, db_before, db_after)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}, "
+          f"lock timeouts {report['lock_timeout_rate']:.2%}")
+    print(f"latency p50 {report['latency_ms']['p50']} ms  p90 {report['latency_ms']['p90']} ms  "
+          f"p99 {report['latency_ms']['p99']} ms")
+    print(f"report written to {args.report}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Check optimized scoring paths against the reference scoring functions on random drives.
+
+Paths (each an optimized implementation and the reference it must agree with):
+
+    drive      calculate_drive_score with the catalog's SynergyMatrix / without it
+    bonus      SynergyMatrix.bonus / calculate_synergy_bonus, for every play of a drive
+    expected   expected_drive_score / the expectation summed over every way the drive's plays can fail
+
+Drives are random card sequences from the real catalog, generated from a fixed
+seed so a run can be repeated. Some cards are sent with altered data (--tamper)
+to exercise the fallback for cards that aren't the catalog's. Any divergence in
+score, yards, multiplier or outcome is reported with a reproducer shrunk to the
+fewest cards that still diverge, and the script exits 1. Each path's speedup is
+the reference's time over the optimized one's, measured on the same drives.
+
+Usage (from backend/):
+    python benchmarks/scoring_equivalence.py [--cases 1000000] [--seed 0] [--paths drive,bonus,expected]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CARD_TYPES, catalog_from_definitions, load_card_definitions
+from deck import HAND_LIMIT
+from scoring import (calculate_drive_score, calculate_synergy_bonus, defense_rating, expected_drive_score,
+                     play_success_chance)
+from synergy import SynergyMatrix
+
+# Result fields a drive path must reproduce exactly
+DRIVE_FIELDS = ('drive_score', 'yards_gained', 'multiplier', 'drive_successful', 'turnover', 'points_scored',
+                'first_down', 'downs_used', 'successful_plays', 'pressure_level')
+
+BATCH_SIZE = 10000
+
+class ScriptedRolls:
+    """Random generator whose d100 rolls succeed for the first successes plays, then fail"""
+
+    def __init__(self, successes):
+        self.successes = successes
+
+    def randint(self, low, high):
+        self.successes -= 1
+        return low if self.successes >= 0 else high
+
+def reference_expected_score(cards, game_state):
+    """Mean drive score, summed over every play at which the drive can first fail, plus all plays succeeding"""
+    defense = defense_rating(game_state)
+    chances = []
+    for i, card in enumerate(cards):
+        if card.get('type') == 'play':
+            risk = card.get('data', {}).get('base_stats', {}).get('risk', 50)
+            chance = play_success_chance(risk, defense, 5 * (i + 1))
+            chances.append(sum(1 for roll in range(1, 101) if roll <= chance) / 100)
+    expected, reached = 0.0, 1.0
+    for successes, chance in enumerate(chances + [None]):
+        outcome = reached * (1 - chance) if chance is not None else reached
+        if outcome:
+            expected += outcome * calculate_drive_score(cards, game_state, ScriptedRolls(successes))['drive_score']
+        if chance is not None:
+            reached *= chance
+    return expected
+
+def drive_path(synergy):
+    def compare(case):
+        reference = calculate_drive_score(case['cards'], case['game_state'], random.Random(case['rng_seed']))
+        optimized = calculate_drive_score(case['cards'], case['game_state'], random.Random(case['rng_seed']), synergy)
+        return {field: (reference[field], optimized[field]) for field in DRIVE_FIELDS
+                if reference[field] != optimized[field]}
+
+    def timed(cases, optimized):
+        rngs = [random.Random(case['rng_seed']) for case in cases]
+        started = time.perf_counter()
+        for case, rng in zip(cases, rngs):
+            calculate_drive_score(case['cards'], case['game_state'], rng, synergy if optimized else None)
+        return time.perf_counter() - started
+    return compare, timed
+
+def bonus_path(synergy):
+    def bonuses(cards, optimized):
+        if optimized:
+            positions = synergy.drive_positions(cards)
+            if positions is not None:
+                return [synergy.bonus(positions, i) for i, card in enumerate(cards) if card.get('type') == 'play']
+        return [calculate_synergy_bonus(card, cards[:i + 1])
+                for i, card in enumerate(cards) if card.get('type') == 'play']
+
+    def compare(case):
+        reference, optimized = bonuses(case['cards'], False), bonuses(case['cards'], True)
+        return {'bonuses': (reference, optimized)} if reference != optimized else {}
+
+    def timed(cases, optimized):
+        started = time.perf_counter()
+        for case in cases:
+            bonuses(case['cards'], optimized)
+        return time.perf_counter() - started
+    return compare, timed
+
+def expected_path(synergy):
+    def compare(case):
+        reference = reference_expected_score(case['cards'], case['game_state'])
+        optimized = expected_drive_score(case['cards'], case['game_state'], synergy)
+        # Both sum the same products, in a different order
+        if abs(reference - optimized) > 1e-9 * max(1.0, reference):
+            return {'expected_score': (reference, optimized)}
+        return {}
+
+    def timed(cases, optimized):
+        started = time.perf_counter()
+        for case in cases:
+            if optimized:
+                expected_drive_score(case['cards'], case['game_state'], synergy)
+            else:
+                reference_expected_score(case['cards'], case['game_state'])
+        return time.perf_counter() - started
+    return compare, timed
+
+PATHS = {'drive': drive_path, 'bonus': bonus_path, 'expected': expected_path}
+
+def tamper(card, rng):
+    """A copy of a catalog card with the data scoring reads changed, as a client could send it"""
+    card = dict(card, data=dict(card['data']))
+    change = rng.randrange(3)
+    if change == 0:
+        card['synergy_tags'] = card['synergy_tags'][:1] + ['tampered']
+    elif change == 1:
+        card['data']['rarity'] = 'legendary'
+    else:
+        card['data']['base_stats'] = dict(card['data'].get('base_stats') or {}, risk=1)
+    return card
+
+def generate_cases(catalog, count, seed, tamper_rate):
+    """Random drives of 1 to HAND_LIMIT cards, weighted towards plays and players so synergies come up"""
+    rng = random.Random(seed)
+    pools = {card_type: catalog.cards_of_type(card_type) for card_type in CARD_TYPES}
+    everything = [card for cards in pools.values() for card in cards]
+    for index in range(count):
+        cards = []
+        for _ in range(rng.randint(1, HAND_LIMIT)):
+            pool = pools[rng.choice(('player', 'play'))] if rng.random() < 0.6 else everything
+            card = rng.choice(pool)
+            cards.append(tamper(card, rng) if rng.random() < tamper_rate else card)
+        yield {
+            'index': index,
+            'cards': cards,
+            'game_state': {'season': rng.randint(1, 4), 'game': rng.randint(1, 5)},
+            'rng_seed': rng.getrandbits(63),
+        }
+
+def shrink(case, compare):
+    """Drop cards, then simplify the game state, for as long as the case still diverges"""
+    case = dict(case)
+    shrunk = True
+    while shrunk and len(case['cards']) > 1:
+        shrunk = False
+        for index in range(len(case['cards'])):
+            candidate = dict(case, cards=case['cards'][:index] + case['cards'][index + 1:])
+            if compare(candidate):
+                case, shrunk = candidate, True
+                break
+    candidate = dict(case, game_state={'season': 1, 'game': 1})
+    return candidate if compare(candidate) else case
+
+def reproducer(case, catalog, differences):
+    """A divergent case as JSON: catalog refs, or the whole card where its data isn't the catalog's"""
+    cards = []
+    for card in case['cards']:
+        catalog_card = catalog.get(card['type'], card['id'])
+        cards.append({'type': card['type'], 'id': card['id']} if card == catalog_card else card)
+    return {
+        'case': case['index'],
+        'cards': cards,
+        'game_state': case['game_state'],
+        'rng_seed': case['rng_seed'],
+        'differences': {field: {'reference': reference, 'optimized': optimized}
+                        for field, (reference, optimized) in differences.items()},
+    }
+
+def run(catalog, paths, cases, seed, tamper_rate, max_failures):
+    synergy = SynergyMatrix(catalog)
+    checks = {name: PATHS[name](synergy) for name in paths}
+    results = {name: {'cases': 0, 'divergent': 0, 'reference_seconds': 0.0, 'optimized_seconds': 0.0,
+                      'reproducers': []} for name in paths}
+    started = time.perf_counter()
+
+    batch = []
+    for case in generate_cases(catalog, cases, seed, tamper_rate):
+        batch.append(case)
+        if len(batch) < BATCH_SIZE and case['index'] < cases - 1:
+            continue
+        for name, (compare, timed) in checks.items():
+            result = results[name]
+            result['reference_seconds'] += timed(batch, False)
+            result['optimized_seconds'] += timed(batch, True)
+            for batch_case in batch:
+                differences = compare(batch_case)
+                if not differences:
+                    continue
+                result['divergent'] += 1
+                if len(result['reproducers']) < max_failures:
+                    shrunk = shrink(batch_case, compare)
+                    result['reproducers'].append(reproducer(shrunk, catalog, compare(shrunk)))
+            result['cases'] += len(batch)
+        batch = []
+        done = case['index'] + 1
+        print(f'{done}/{cases} drives, {time.perf_counter() - started:.0f}s', file=sys.stderr)
+
+    for result in results.values():
+        result['speedup'] = round(result['reference_seconds'] / result['optimized_seconds'], 2)
+        result['reference_seconds'] = round(result['reference_seconds'], 3)
+        result['optimized_seconds'] = round(result['optimized_seconds'], 3)
+    return {'seed': seed, 'cases': cases, 'tamper_rate': tamper_rate, 'catalog_version': catalog.version,
+            'paths': results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', default='cards.json')
+    parser.add_argument('--cases', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--paths', default=','.join(PATHS), help=f'comma-separated, from {", ".join(PATHS)}')
+    parser.add_argument('--tamper', type=float, default=0.02, help='share of cards sent with altered data')
+    parser.add_argument('--max-failures', type=int, default=5, help='reproducers kept per path')
+    parser.add_argument('--report', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    paths = args.paths.split(',')
+    unknown = [name for name in paths if name not in PATHS]
+    if unknown:
+        parser.error(f'unknown paths: {", ".join(unknown)}')
+    definitions, version = load_card_definitions(args.catalog)
+    report = run(catalog_from_definitions(definitions, version), paths, args.cases, args.seed, args.tamper,
+                 args.max_failures)
+
+    print(f"{'path':<10} {'cases':>9} {'divergent':>10} {'reference s':>12} {'optimized s':>12} {'speedup':>8}")
+    for name, result in report['paths'].items():
+        print(f"{name:<10} {result['cases']:>9} {result['divergent']:>10} {result['reference_seconds']:>12.3f} "
+              f"{result['optimized_seconds']:>12.3f} {result['speedup']:>7.2f}x")
+        for case in result['reproducers']:
+            print(f'  {name} diverges: {json.dumps(case)}')
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if any(result['divergent'] for result in report['paths'].values()) else 0)
+
+if __name__ == '__main__':
+    main()
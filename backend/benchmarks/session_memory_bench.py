@@ -0,0 +1,98 @@
+"""Measure the memory a live session's cards take in-process, per representation.
+
+    json columns     zones parsed from the old JSON TEXT columns: full nested card dicts
+    hydrated dicts   a dict copy of the catalog card plus instance id per card (the old hydrate)
+    card instances   a slotted CardInstance view of the shared catalog card per card
+    packed refs      the snapshot blob only, as the draw pile works on it
+
+The catalog is built before measuring, since it is shared by every session, and
+is measured separately with and without interned strings.
+
+Usage (from backend/):
+    python benchmarks/session_memory_bench.py [--catalog cards.json] [--sessions 2000] [--deck-size 30]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog as catalog_module
+from catalog import catalog_from_definitions, load_card_definitions
+from snapshot import SessionSnapshot, encode_snapshot
+
+ZONES = ('deck_cards', 'hand', 'bench', 'field', 'discard_pile')
+
+def build_zones(catalog, deck_size, rng):
+    """A mid-game session's cards spread across every zone, numbered like a real session"""
+    cards = [dict(card, instance_id=instance_id)
+             for instance_id, card in enumerate(rng.choices(list(catalog.cards.values()), k=deck_size), 1)]
+    return {
+        'deck_cards': cards[:deck_size - 14],
+        'hand': cards[deck_size - 14:deck_size - 8],
+        'bench': cards[deck_size - 8:deck_size - 6],
+        'field': cards[deck_size - 6:deck_size - 4],
+        'discard_pile': cards[deck_size - 4:],
+    }
+
+def measure(build, count):
+    """Bytes allocated per item for count items built by build(index), all kept alive"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(index) for index in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', default='cards.json')
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--deck-size', type=int, default=30)
+    args = parser.parse_args()
+
+    definitions, _ = load_card_definitions(args.catalog)
+    # Round-trip through JSON so every catalog build starts from freshly decoded strings
+    text = json.dumps(definitions)
+
+    interned = catalog_module.intern_strings
+    catalog_module.intern_strings = lambda value: value
+    plain_bytes = measure(lambda _: catalog_from_definitions(json.loads(text)), 1)
+    catalog_module.intern_strings = interned
+    interned_bytes = measure(lambda _: catalog_from_definitions(json.loads(text)), 1)
+    catalog = catalog_from_definitions(json.loads(text))
+
+    rng = random.Random(0)
+    sessions = [build_zones(catalog, args.deck_size, rng) for _ in range(args.sessions)]
+    columns = [[json.dumps(session[name]) for name in ZONES] for session in sessions]
+    blobs = [encode_snapshot(session) for session in sessions]
+
+    def hydrated_dicts(index):
+        snapshot = SessionSnapshot(blobs[index], catalog.get)
+        return [[card.to_dict() for card in snapshot.zone(name)] for name in ZONES]
+
+    def card_instances(index):
+        snapshot = SessionSnapshot(blobs[index], catalog.get)
+        return [snapshot.zone(name) for name in ZONES]
+
+    results = [
+        ('json columns', measure(lambda index: [json.loads(column) for column in columns[index]], args.sessions)),
+        ('hydrated dicts', measure(hydrated_dicts, args.sessions)),
+        ('card instances', measure(card_instances, args.sessions)),
+        ('packed refs', measure(lambda index: SessionSnapshot(bytes(blobs[index]), catalog.get), args.sessions)),
+    ]
+
+    print(f'{args.sessions} sessions of {args.deck_size} cards, catalog of {len(catalog.cards)} cards')
+    print(f'catalog: {plain_bytes / 1024:.0f} KiB, {interned_bytes / 1024:.0f} KiB with interned strings')
+    print(f"{'representation':<16} {'bytes/session':>14} {'bytes/card':>11}")
+    for name, per_session in results:
+        print(f'{name:<16} {per_session:>14,.0f} {per_session / args.deck_size:>11,.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compare binary session snapshots against the JSON TEXT columns.
+
+Usage (from backend/):
+    python benchmarks/snapshot_bench.py [--database fantasy_football.db] [--deck-size 30]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import load_catalog
+from snapshot import SessionSnapshot, encode_snapshot
+
+PROGRESS = {
+    'current_season': 1, 'current_game': 3, 'current_drive': 2, 'score': 1840, 'coaching_points': 45,
+    'downs': 2, 'distance': 4, 'yards_to_go': 10, 'pressure_level': 15,
+    'game_progress': {'current_game': 3, 'current_drive': 2, 'drives_completed': 1, 'games_won': 2,
+                      'total_drives_in_game': 4, 'total_games_in_season': 10},
+    'season_progress': {'current_season': 1, 'games_won': 2, 'seasons_won': 0,
+                        'total_games_in_season': 10, 'total_seasons': 10},
+    'career_progress': {'current_level': 'high_school', 'total_score': 1840, 'championships_won': 0,
+                        'super_bowls_won': 0, 'hall_of_fame_points': 0},
+}
+
+def build_session(catalog, deck_size):
+    """Build a mid-game session with cards spread across every zone"""
+    cards = [random.choice(list(catalog.cards.values())) for _ in range(deck_size)]
+    return {
+        'deck': {'players': [1, 2], 'plays': [1, 2, 3], 'modifiers': [1]},
+        'deck_cards': cards[:deck_size - 14],
+        'hand': cards[deck_size - 14:deck_size - 8],
+        'bench': cards[deck_size - 8:deck_size - 6],
+        'field': cards[deck_size - 6:deck_size - 4],
+        'discard_pile': cards[deck_size - 4:],
+    }
+
+def json_columns(session):
+    """The nine JSON TEXT column values the old schema writes"""
+    return [json.dumps(session[name]) for name in ('deck', 'deck_cards', 'hand', 'bench', 'field', 'discard_pile')] + [
+        json.dumps(PROGRESS['career_progress']), json.dumps(PROGRESS['game_progress']),
+        json.dumps(PROGRESS['season_progress'])]
+
+def encode(session):
+    zones = {name: session[name] for name in ('deck_cards', 'hand', 'bench', 'field', 'discard_pile')}
+    return encode_snapshot(zones, deck_config=session['deck'], progress=PROGRESS, rng=(12345, 7),
+                           meta={'player_name': 'Player', 'deck_type': 'balanced_offense',
+                                 'career_level': 'high_school'})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='fantasy_football.db')
+    parser.add_argument('--deck-size', type=int, default=30)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    catalog = load_catalog(args.database)
+    session = build_session(catalog, args.deck_size)
+    columns = json_columns(session)
+    blob = encode(session)
+
+    def time_us(fn):
+        return min(timeit.repeat(fn, number=args.number, repeat=5)) / args.number * 1e6
+
+    results = {
+        'json_bytes': sum(len(column.encode('utf-8')) for column in columns),
+        'snapshot_bytes': len(blob),
+        'json_encode_us': time_us(lambda: json_columns(session)),
+        'snapshot_encode_us': time_us(lambda: encode(session)),
+        'json_decode_us': time_us(lambda: [json.loads(column) for column in columns]),
+        'snapshot_decode_us': time_us(lambda: [SessionSnapshot(blob, catalog.get).zone(name) for name in
+                                               ('deck_cards', 'hand', 'bench', 'field', 'discard_pile')]),
+        'json_decode_hand_us': time_us(lambda: json.loads(columns[2])),
+        'snapshot_decode_hand_us': time_us(lambda: SessionSnapshot(blob, catalog.get).zone('hand')),
+    }
+
+    print(f"deck size {args.deck_size}")
+    print(f"size        json {results['json_bytes']:>8} B   snapshot {results['snapshot_bytes']:>8} B   "
+          f"({results['json_bytes'] / results['snapshot_bytes']:.1f}x smaller)")
+    for label, key in (('encode', 'encode'), ('decode all', 'decode'), ('decode hand', 'decode_hand')):
+        json_us = results[f'json_{key}_us']
+        snapshot_us = results[f'snapshot_{key}_us']
+        print(f"{label:<11} json {json_us:>8.1f} us  snapshot {snapshot_us:>8.1f} us  ({json_us / snapshot_us:.1f}x)")
+
+if __name__ == '__main__':
+    main()
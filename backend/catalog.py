@@ -0,0 +1,397 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+CARD_TYPES = ('player', 'play', 'modifier')
+
+# Catalog table and column order (after id) for each card type
+CARD_TABLES = {
+    'player': ('players', ('name', 'position', 'team', 'base_stats', 'synergy_tags', 'rarity', 'cost')),
+    'play': ('plays', ('name', 'play_type', 'base_stats', 'synergy_tags', 'rarity', 'cost')),
+    'modifier': ('modifiers', ('name', 'modifier_type', 'effect', 'synergy_tags', 'rarity', 'cost')),
+}
+JSON_COLUMNS = ('base_stats', 'effect', 'synergy_tags')
+
+class CatalogError(ValueError):
+    """Raised when card definitions can't be turned into a catalog"""
+
+def intern_strings(value):
+    """Intern every string in decoded card data, so the tags, positions and rarities repeated
+    across cards share one object each"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [intern_strings(item) for item in value]
+    if isinstance(value, dict):
+        return {sys.intern(key): intern_strings(item) for key, item in value.items()}
+    return value
+
+def build_card(card_type: str, definition: dict) -> dict:
+    """Build an API card dict from a card definition"""
+    data = {'id': definition['id']}
+    for column in CARD_TABLES[card_type][1]:
+        data[column] = intern_strings(definition[column])
+    return {
+        'id': definition['id'],
+        'type': card_type,
+        'data': data,
+        'synergy_tags': data['synergy_tags']
+    }
+
+def row_definition(card_type: str, row: tuple) -> dict:
+    """Turn a catalog table row into a card definition"""
+    definition = {'id': row[0]}
+    for column, value in zip(CARD_TABLES[card_type][1], row[1:]):
+        definition[column] = json.loads(value) if column in JSON_COLUMNS else value
+    return definition
+
+def definition_row(card_type: str, definition: dict) -> tuple:
+    """Turn a card definition into a catalog table row"""
+    values = [definition['id']]
+    for column in CARD_TABLES[card_type][1]:
+        value = definition[column]
+        values.append(json.dumps(value) if column in JSON_COLUMNS else value)
+    return tuple(values)
+
+class Catalog:
+    """One immutable version of every card definition, keyed by (card type, catalog id)"""
+
+    def __init__(self, cards: Dict[Tuple[str, int], dict], version: Optional[str] = None):
+        self.cards = MappingProxyType(dict(cards))
+        self._by_type = {card_type: [card for (kind, _), card in sorted(self.cards.items()) if kind == card_type]
+                         for card_type in CARD_TYPES}
+        if version is None:
+            payload = json.dumps(sorted(self.cards.items()), sort_keys=True).encode('utf-8')
+            version = hashlib.sha1(payload).hexdigest()[:12]
+        self.version = version
+        # Derived lookup structures, filled in by CatalogRegistry.on_build hooks
+        self.indexes = {}
+        # Pre-serialized response bodies, filled in from CatalogRegistry.documents
+        self.documents = {}
+
+    @property
+    def etag(self) -> str:
+        """Cache validator for the catalog - its version, which is a content hash"""
+        return self.version
+
+    def to_wire(self) -> Dict[str, Dict[int, dict]]:
+        """Card data grouped by type and keyed by id, without the per-card wrapper"""
+        return {card_type: {card['id']: card['data'] for card in cards} for card_type, cards in self._by_type.items()}
+
+    def get(self, card_type: str, card_id: int) -> Optional[dict]:
+        """Return the hydrated card for a reference, or None if it is unknown"""
+        return self.cards.get((card_type, card_id))
+
+    def cards_of_type(self, card_type: str) -> List[dict]:
+        """Return all cards of one type in catalog id order"""
+        return self._by_type[card_type]
+
+    def ids_of_type(self, card_type: str) -> List[int]:
+        """Return the catalog ids of one type in order, without hydrating cards"""
+        return [card['id'] for card in self._by_type[card_type]]
+
+    def rarity(self, card_type: str, card_id: int) -> Optional[str]:
+        card = self.get(card_type, card_id)
+        return card['data']['rarity'] if card else None
+
+def check_definition(table: str, card_type: str, definition) -> None:
+    """Raise CatalogError unless a card definition has every column, with the type the game reads it as"""
+    if not isinstance(definition, dict):
+        raise CatalogError(f'{table} entries must be objects, not {type(definition).__name__}')
+    card_id = definition.get('id')
+    if isinstance(card_id, bool) or not isinstance(card_id, int):
+        raise CatalogError(f'{table} entry has a non-integer id {card_id!r}')
+    for column in CARD_TABLES[card_type][1]:
+        if column not in definition:
+            raise CatalogError(f"{table} entry {card_id} is missing '{column}'")
+        value = definition[column]
+        if column == 'synergy_tags':
+            valid = isinstance(value, list) and all(isinstance(tag, str) for tag in value)
+        elif column in JSON_COLUMNS:
+            valid = isinstance(value, dict)
+        elif column == 'cost':
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, str)
+        if not valid:
+            raise CatalogError(f'{table} entry {card_id} has an invalid {column} {value!r}')
+
+def catalog_from_definitions(definitions: Dict[str, List[dict]], version: Optional[str] = None,
+                             required: Iterable[Tuple[str, int]] = ()) -> Catalog:
+    """Build a Catalog from {'players': [...], 'plays': [...], 'modifiers': [...]}, checking the shape of every
+    definition and that every required (card type, catalog id) is defined"""
+    if not isinstance(definitions, dict):
+        raise CatalogError(f'Card definitions must be an object of card lists, not {type(definitions).__name__}')
+    cards = {}
+    for card_type, (table, _) in CARD_TABLES.items():
+        entries = definitions.get(table, [])
+        if not isinstance(entries, list):
+            raise CatalogError(f'{table} must be a list of cards')
+        for definition in entries:
+            check_definition(table, card_type, definition)
+            card = build_card(card_type, definition)
+            if (card_type, card['id']) in cards:
+                raise CatalogError(f'Duplicate {card_type} id {card["id"]}')
+            cards[(card_type, card['id'])] = card
+    missing = sorted(ref for ref in set(required) if ref not in cards)
+    if missing:
+        raise CatalogError(f'Missing cards: {", ".join(f"{card_type} {card_id}" for card_type, card_id in missing)}')
+    return Catalog(cards, version)
+
+def load_card_definitions(path: str) -> Tuple[dict, str]:
+    """Read a card data file, returning its definitions and content-hash version"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        definitions = json.loads(content)
+    except ValueError as e:
+        raise CatalogError(f'{path} is not valid JSON: {e}')
+    return definitions, hashlib.sha1(content).hexdigest()[:12]
+
+def load_catalog(database: str) -> Catalog:
+    """Read the players, plays and modifiers tables into a Catalog"""
+    conn = storage.connect(database)
+    cursor = conn.cursor()
+
+    cards = {}
+    for card_type, (table, _) in CARD_TABLES.items():
+        cursor.execute(f'SELECT * FROM {table}')
+        for row in cursor.fetchall():
+            cards[(card_type, row[0])] = build_card(card_type, row_definition(card_type, row))
+
+    conn.close()
+    return Catalog(cards)
+
+class CatalogRepository:
+    """Where the seeded card tables and the definitions of every catalog version are kept"""
+
+    def seeded(self) -> bool:
+        """Whether the card tables hold any cards yet"""
+        raise NotImplementedError
+
+    def seed(self, definitions: Dict[str, List[dict]]):
+        """Fill the empty card tables from card definitions"""
+        raise NotImplementedError
+
+    def load_seeded(self) -> Catalog:
+        """The catalog the card tables were seeded with, for serving without a data file"""
+        raise NotImplementedError
+
+    def load_version(self, version: str) -> Optional[dict]:
+        """A version's card definitions, or None if it was never saved"""
+        raise NotImplementedError
+
+    def save_version(self, version: str, definitions: dict):
+        """Keep a version's definitions so sessions pinned to it survive restarts"""
+        raise NotImplementedError
+
+class SQLiteCatalogRepository(CatalogRepository):
+    """Card tables and the catalog_versions table of a file or in-memory database (see storage.py)"""
+
+    def __init__(self, database: str):
+        self.database = database
+
+    def seeded(self):
+        conn = storage.connect(self.database)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM players').fetchone()[0] > 0
+        finally:
+            conn.close()
+
+    def seed(self, definitions):
+        conn = storage.connect(self.database)
+        try:
+            for card_type, (table, columns) in CARD_TABLES.items():
+                rows = [definition_row(card_type, definition) for definition in definitions.get(table, [])]
+                conn.executemany(f'INSERT INTO {table} (id, {", ".join(columns)}) '
+                                 f'VALUES ({", ".join("?" * (len(columns) + 1))})', rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load_seeded(self):
+        return load_catalog(self.database)
+
+    def load_version(self, version):
+        try:
+            conn = storage.connect(self.database)
+            row = conn.execute('SELECT content FROM catalog_versions WHERE version = ?', (version,)).fetchone()
+            conn.close()
+        except sqlite3.Error:
+            row = None
+        return json.loads(row[0]) if row else None
+
+    def save_version(self, version, definitions):
+        try:
+            conn = storage.connect(self.database, timeout=30)
+            conn.execute('INSERT OR IGNORE INTO catalog_versions (version, content) VALUES (?, ?)',
+                         (version, json.dumps(definitions)))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning('Could not record catalog version %s: %s', version, e)
+
+class DictCatalogRepository(CatalogRepository):
+    """Card definitions in dicts of this process, no SQLite at all. Everything is copied in and out, like a
+    database round trip."""
+
+    def __init__(self):
+        self.definitions: Dict[str, List[dict]] = {}  # as seeded
+        self.versions: Dict[str, dict] = {}
+
+    def seeded(self):
+        return any(self.definitions.values())
+
+    def seed(self, definitions):
+        self.definitions = copy.deepcopy(definitions)
+
+    def load_seeded(self):
+        return catalog_from_definitions(self.definitions)
+
+    def load_version(self, version):
+        definitions = self.versions.get(version)
+        return copy.deepcopy(definitions) if definitions is not None else None
+
+    def save_version(self, version, definitions):
+        self.versions.setdefault(version, copy.deepcopy(definitions))
+
+class CatalogRegistry:
+    """The live catalog built from a data file, plus older versions sessions are pinned to.
+
+    Reloads build the new catalog completely, including anything registered in
+    on_build, before swapping it in with a single assignment, so requests never
+    see a half-built catalog or wait for one.
+
+    With a shared_dir, each version is written once to a memory-mapped catalog
+    file (see shared_catalog.py) that every worker process maps instead of
+    keeping its own hydrated copy.
+
+    Versions are kept in a CatalogRepository; a database name means the
+    SQLiteCatalogRepository of that database.
+    """
+
+    def __init__(self, path: str, database: Union[str, CatalogRepository], shared_dir: Optional[str] = None):
+        self.path = path
+        self.repository = SQLiteCatalogRepository(database) if isinstance(database, str) else database
+        self.shared_dir = shared_dir
+        self.on_build: List[Callable[[Catalog], None]] = []
+        # (card type, catalog id) refs a new live version must define, e.g. every deck config's cards
+        self.required: List[Tuple[str, int]] = []
+        # Named response bodies serialized once per catalog version
+        self.documents: Dict[str, Callable[[Catalog], bytes]] = {}
+        self._current = None
+        self._versions = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> Catalog:
+        if self._current is None:
+            self.reload()
+        return self._current
+
+    def get(self, version: Optional[str]) -> Catalog:
+        """Get a catalog version, loading it from the database if it isn't in memory"""
+        if version is None:
+            return self.current
+        catalog = self._versions.get(version)
+        if catalog is None:
+            with self._lock:
+                catalog = self._versions.get(version) or self._load_version(version)
+        return catalog
+
+    def _load_version(self, version: str) -> Catalog:
+        definitions = self.repository.load_version(version)
+        if definitions is None:
+            logger.warning('Catalog version %s is unknown, using the current catalog', version)
+            return self.current
+        catalog = self._build(definitions, version)
+        self._versions[version] = catalog
+        return catalog
+
+    def _build(self, definitions: dict, version: str, required: Iterable[Tuple[str, int]] = ()) -> Catalog:
+        return self._finish(catalog_from_definitions(definitions, version, required))
+
+    def _serialize(self, catalog: Catalog) -> Dict[str, bytes]:
+        return {name: serialize(catalog) for name, serialize in self.documents.items()}
+
+    def _finish(self, catalog: Catalog) -> Catalog:
+        """Serialize documents, swap in the shared mapping if enabled, and run build hooks"""
+        if self.shared_dir:
+            # Imported here so shared_catalog can build on this module
+            from shared_catalog import MappedCatalog, catalog_file_path, write_catalog_file
+            os.makedirs(self.shared_dir, exist_ok=True)
+            shared_path = catalog_file_path(self.shared_dir, catalog.version)
+            if not os.path.exists(shared_path):
+                # First worker to build this version writes it for the others
+                write_catalog_file(catalog, shared_path, self._serialize(catalog))
+            catalog = MappedCatalog(shared_path)
+        else:
+            catalog.documents.update(self._serialize(catalog))
+        for hook in self.on_build:
+            hook(catalog)
+        return catalog
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> bool:
+        """Rebuild from the data file and swap it in; returns True if the version changed"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                # No data file - serve whatever the database was seeded with
+                if self._current is None:
+                    catalog = self._finish(self.repository.load_seeded())
+                    self._versions[catalog.version] = catalog
+                    self._current = catalog
+                return False
+
+            stamp = self._file_stamp()
+            definitions, version = load_card_definitions(self.path)
+            self._stamp = stamp
+            if self._current is not None and version == self._current.version:
+                return False
+
+            # Versions pinned by older sessions are loaded as they were; only a new live version must have
+            # every required card
+            catalog = self._build(definitions, version, self.required)
+            self.repository.save_version(version, definitions)
+            self._versions[version] = catalog
+            self._current = catalog
+            logger.info('Catalog version %s is live (%d cards)', version, len(catalog.cards))
+            return True
+
+    def check(self):
+        """Reload if the data file changed since it was last read"""
+        try:
+            if os.path.exists(self.path) and self._file_stamp() != self._stamp:
+                self.reload()
+        except (OSError, CatalogError) as e:
+            # Keep serving the last good catalog
+            logger.error('Catalog reload failed: %s', e)
+        except Exception:
+            # Anything else is a bug, but must not stop the watcher picking up a fixed file
+            logger.exception('Catalog reload failed')
+
+    def watch(self, interval: float = 1.0) -> threading.Thread:
+        """Poll the data file in a background thread and hot-swap on change"""
+        def run():
+            while True:
+                self.check()
+                stop.wait(interval)
+        stop = threading.Event()
+        thread = threading.Thread(target=run, name='catalog-watcher', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,138 @@
+"""Draw pile engine working directly on packed snapshot card refs.
+
+The draw pile is the 'deck_cards' zone in draw order. Drawing advances a cursor
+over its bytes instead of rebuilding a card list, discarding appends to the
+discard pile, and when the draw pile runs out mid-draw the discard pile is
+shuffled with the session's rng stream to become the new draw pile. Only the
+cards that end up in a response ever need hydrating.
+
+New sessions are dealt from a DeckTemplate: a deck type's starting deck packed
+once per catalog version, then copied and shuffled for each session.
+"""
+from typing import Dict, List
+
+from snapshot import CARD_REF, TYPE_CODES, SessionSnapshot, unpack_refs
+
+# Most cards a hand can hold
+HAND_LIMIT = 8
+
+# Copies of each deck config card in a starting deck: players 3, plays 4 and modifiers 2 to reach 30 cards
+DECK_COPIES = (('player', 'players', 3), ('play', 'plays', 4), ('modifier', 'modifiers', 2))
+
+class DeckTemplate:
+    """A deck config's starting deck, resolved against one catalog version and packed once"""
+
+    def __init__(self, deck_config: dict, catalog):
+        refs = []
+        for card_type, key, copies in DECK_COPIES:
+            for card_id in deck_config[key]:
+                # Cards missing from this catalog version are left out
+                if catalog.get(card_type, card_id):
+                    refs.extend([(TYPE_CODES[card_type], card_id)] * copies)
+        # Each slot keeps its instance id wherever the shuffle puts it
+        self.cards = [CARD_REF.pack(code, card_id, instance_id) for instance_id, (code, card_id) in enumerate(refs, 1)]
+
+    def __len__(self):
+        return len(self.cards)
+
+    def deal(self, rng) -> bytes:
+        """A shuffled copy of the deck, packed as the deck_cards zone of a new session"""
+        cards = list(self.cards)
+        rng.shuffle(cards)
+        return b''.join(cards)
+
+class DrawPile:
+    """The deck_cards, hand and discard_pile zones of one session"""
+
+    def __init__(self, deck_cards: bytes, hand: bytes, discard_pile: bytes, rng):
+        self.order = deck_cards
+        self.cursor = 0
+        self.hand = bytearray(hand)
+        self.discard_pile = bytearray(discard_pile)
+        self.rng = rng
+        self.reshuffles = 0
+        # Delta ops describing every change, in order
+        self.ops = []
+
+    @classmethod
+    def from_snapshot(cls, snapshot: SessionSnapshot, rng) -> 'DrawPile':
+        return cls(snapshot.raw_zone('deck_cards'), snapshot.raw_zone('hand'), snapshot.raw_zone('discard_pile'), rng)
+
+    def remaining(self) -> int:
+        return len(self.order) // CARD_REF.size - self.cursor
+
+    def hand_size(self) -> int:
+        return len(self.hand) // CARD_REF.size
+
+    def hand_refs(self) -> List[tuple]:
+        return unpack_refs(self.hand)
+
+    def draw(self, count: int) -> List[tuple]:
+        """Move up to count cards to the hand, reshuffling the discard pile if the draw pile runs out"""
+        count = max(0, min(count, HAND_LIMIT - self.hand_size()))
+        drawn = bytearray()
+        while count:
+            if not self.remaining():
+                if not self.discard_pile:
+                    break
+                self._reshuffle()
+            take = min(count, self.remaining())
+            start = self.cursor * CARD_REF.size
+            drawn += self.order[start:start + take * CARD_REF.size]
+            self.cursor += take
+            count -= take
+            self.ops.append({'op': 'move', 'from': 'deck_cards', 'to': 'hand', 'count': take})
+        self.hand += drawn
+        return unpack_refs(drawn)
+
+    def discard_hand(self) -> int:
+        """Move the whole hand to the discard pile"""
+        count = self.hand_size()
+        if count:
+            self.discard_pile += self.hand
+            self.hand = bytearray()
+            self.ops.append({'op': 'move', 'from': 'hand', 'to': 'discard_pile', 'count': count})
+        return count
+
+    def discard_from_hand(self, refs: List[tuple]) -> List[int]:
+        """Discard the hand card matching each (card type, catalog id, instance id) ref, returning the
+        hand indexes that were discarded. A ref without an instance id matches the first such copy."""
+        hand = self.hand_refs()
+        indexes = []
+        for card_type, card_id, instance_id in refs:
+            for index, held in enumerate(hand):
+                if index in indexes:
+                    continue
+                if (held[2] == instance_id) if instance_id else (held[:2] == (card_type, card_id)):
+                    indexes.append(index)
+                    break
+        if not indexes:
+            return []
+
+        size = CARD_REF.size
+        for index in indexes:
+            self.discard_pile += self.hand[index * size:(index + 1) * size]
+        discarded = set(indexes)
+        self.hand = bytearray(b''.join(self.hand[index * size:(index + 1) * size]
+                                       for index in range(len(hand)) if index not in discarded))
+        self.ops.append({'op': 'discard', 'from': 'hand', 'indexes': indexes})
+        return indexes
+
+    def _reshuffle(self):
+        size = CARD_REF.size
+        cards = [bytes(self.discard_pile[start:start + size]) for start in range(0, len(self.discard_pile), size)]
+        self.rng.shuffle(cards)
+        self.order = b''.join(cards)
+        self.cursor = 0
+        self.discard_pile = bytearray()
+        self.reshuffles += 1
+        self.ops.append({'op': 'reshuffle', 'cards': [{'type': card_type, 'id': card_id, 'instance_id': instance_id}
+                                                      for card_type, card_id, instance_id in unpack_refs(self.order)]})
+
+    def zones(self) -> Dict[str, bytes]:
+        """Packed zones to write back with SessionSnapshot.replace_packed"""
+        return {
+            'deck_cards': self.order[self.cursor * CARD_REF.size:],
+            'hand': bytes(self.hand),
+            'discard_pile': bytes(self.discard_pile),
+        }
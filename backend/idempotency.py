@@ -0,0 +1,245 @@
+"""Idempotency keys and per-session single-flight for mutating endpoints.
+
+A client may send an Idempotency-Key header with any mutating request. The first
+request with a key claims it in the idempotency_keys table of the session's
+shard and runs the handler; its response is stored in the same row. Duplicates
+that arrive while it is still running - on any worker process - poll that row
+with plain reads until it is filled in, and later replays are answered from it
+until it expires. Each process also keeps the results it has seen in a bounded
+TTL cache, so most replays don't touch the database at all. Only claiming a key
+and storing its result take the shard's write lock.
+
+Requests for the same session are serialized, with or without a key: handlers
+open their shard with ShardRouter.session_transaction, which takes the shard's
+write lock before the session is read, so no other process can interleave its
+own read-modify-write. Within a process they also queue on a per-session lock
+rather than spinning on SQLite's busy timeout.
+
+A worker that dies mid-request leaves its claim behind; once the claim is older
+than CLAIM_TIMEOUT the next duplicate runs the request again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from shards import ShardRouter
+
+# How long a finished result can be replayed, and how many each process caches
+RESULT_TTL = 600
+MAX_RESULTS = 10000
+
+# Expired keys deleted per stored result, so pruning never holds the write lock for long
+PRUNE_BATCH = 100
+
+# How long a duplicate waits for the in-flight original before giving up, and how often it looks
+INFLIGHT_WAIT = 30
+POLL_INTERVAL = 0.05
+
+# How old an unfinished claim must be before it is taken for a crashed worker's
+CLAIM_TIMEOUT = 120
+
+def create_idempotency_table(cursor):
+    """Create the table of claimed keys and their results in one shard"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            session_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            claimed_at REAL NOT NULL,  -- unix time
+            status INTEGER,  -- NULL while the original request is running
+            body BLOB,
+            mimetype TEXT,
+            PRIMARY KEY (session_id, path, key)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_claimed ON idempotency_keys (claimed_at)')
+
+class ResultCache:
+    """LRU cache of finished responses that expire after a TTL"""
+
+    def __init__(self, max_entries=MAX_RESULTS, ttl=RESULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class SessionLocks:
+    """One lock per session, dropped again once nobody holds or waits on it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}
+
+    def acquire(self, session_id):
+        with self.lock:
+            entry = self.locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+
+    def release(self, session_id):
+        with self.lock:
+            entry = self.locks[session_id]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[session_id]
+
+def _fingerprint():
+    return hashlib.sha1(request.get_data()).hexdigest()
+
+def _replay(result):
+    status, body, mimetype = result
+    response = current_app.response_class(body, status=status, mimetype=mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _key_mismatch():
+    return current_app.make_response(({'error': 'Idempotency-Key was already used with a different request'}, 422))
+
+class SingleFlight:
+    """Decorator that serializes a session endpoint and deduplicates requests by Idempotency-Key, keeping claimed
+    keys and their results in the session's shard"""
+
+    KEY_QUERY = '''
+        SELECT fingerprint, claimed_at, status, body, mimetype FROM idempotency_keys
+        WHERE session_id = ? AND path = ? AND key = ?
+    '''
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+        self.session_locks = SessionLocks()
+        self.results = ResultCache()
+
+    @staticmethod
+    def outcome(row, fingerprint, now):
+        """What a request with this fingerprint does about a key's row: ('run', None) if the key is free,
+        ('replay', result), ('running', None) while another request holds it, or ('mismatch', None) if it was
+        used with a different request"""
+        if row is None or row[1] < now - RESULT_TTL:
+            return 'run', None
+        if row[0] != fingerprint:
+            return 'mismatch', None
+        if row[2] is not None:
+            return 'replay', tuple(row[2:])
+        if row[1] < now - CLAIM_TIMEOUT:
+            # Left behind by a worker that died
+            return 'run', None
+        return 'running', None
+
+    def claim(self, session_id, path, key, fingerprint):
+        """Claim a key for this request if it is free, returning its outcome. The row is read without a lock;
+        the shard's write lock is only taken to insert the claim."""
+        conn = self.router.connect_session(session_id)
+        try:
+            row = conn.execute(self.KEY_QUERY, (session_id, path, key)).fetchone()
+        finally:
+            conn.close()
+        outcome, result = self.outcome(row, fingerprint, time.time())
+        if outcome != 'run':
+            return outcome, result
+
+        with self.router.session_transaction(session_id) as conn:
+            # Look again under the lock - another worker may have claimed it in between
+            now = time.time()
+            outcome, result = self.outcome(conn.execute(self.KEY_QUERY, (session_id, path, key)).fetchone(),
+                                           fingerprint, now)
+            if outcome == 'run':
+                conn.execute('''
+                    INSERT OR REPLACE INTO idempotency_keys (session_id, path, key, fingerprint, claimed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (session_id, path, key, fingerprint, now))
+                conn.commit()
+            return outcome, result
+
+    def finish(self, session_id, path, key, result):
+        """Store a claimed key's result, or release the claim if there is none to replay, and prune a batch of
+        expired keys"""
+        with self.router.session_transaction(session_id) as conn:
+            if result is None:
+                conn.execute('DELETE FROM idempotency_keys WHERE session_id = ? AND path = ? AND key = ?',
+                             (session_id, path, key))
+            else:
+                conn.execute('''
+                    UPDATE idempotency_keys SET status = ?, body = ?, mimetype = ?
+                    WHERE session_id = ? AND path = ? AND key = ?
+                ''', (*result, session_id, path, key))
+            conn.execute('''
+                DELETE FROM idempotency_keys WHERE rowid IN (
+                    SELECT rowid FROM idempotency_keys WHERE claimed_at < ? LIMIT ?
+                )
+            ''', (time.time() - RESULT_TTL, PRUNE_BATCH))
+            conn.commit()
+
+    def run(self, view, session_id, *args, **kwargs):
+        self.session_locks.acquire(session_id)
+        try:
+            return current_app.make_response(view(session_id, *args, **kwargs))
+        finally:
+            self.session_locks.release(session_id)
+
+    def __call__(self, view):
+        @wraps(view)
+        def wrapper(session_id, *args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return self.run(view, session_id, *args, **kwargs)
+
+            path = request.path
+            fingerprint = _fingerprint()
+            cache_key = (session_id, path, key)
+            cached = self.results.get(cache_key)
+            if cached is not None:
+                if cached[0] != fingerprint:
+                    return _key_mismatch()
+                return _replay(cached[1])
+
+            deadline = time.monotonic() + INFLIGHT_WAIT
+            while True:
+                outcome, result = self.claim(session_id, path, key, fingerprint)
+                if outcome == 'mismatch':
+                    return _key_mismatch()
+                if outcome == 'replay':
+                    self.results.put(cache_key, (fingerprint, result))
+                    return _replay(result)
+                if outcome == 'run':
+                    break
+                # A duplicate of a request that is still running - wait for its answer
+                if time.monotonic() >= deadline:
+                    return current_app.make_response(({'error': 'Original request is still in progress'}, 409))
+                time.sleep(POLL_INTERVAL)
+
+            result = None
+            try:
+                response = self.run(view, session_id, *args, **kwargs)
+                # Server errors are not kept so the client can retry them
+                if response.status_code < 500 and not response.is_streamed:
+                    result = (response.status_code, response.get_data(), response.mimetype)
+                return response
+            finally:
+                self.finish(session_id, path, key, result)
+                if result is not None:
+                    self.results.put(cache_key, (fingerprint, result))
+        return wrapper
@@ -0,0 +1,336 @@
+"""Background jobs for work too slow to run inside a request.
+
+Simulations and replay verification can take seconds, which would tie up a web
+worker thread and stall the gameplay requests queued behind it. Instead they are
+submitted to a JobQueue: each job runs in its own child process, at most
+max_workers at a time per server process, at lowered CPU priority so request
+handling stays responsive. A dispatcher thread starts queued jobs, collects
+their results, and terminates any job that is cancelled or passes its deadline.
+
+Job state and results live in the jobs table of the catalog database, so any
+worker process can answer a poll or take a cancellation for a job another
+process is running. Finished jobs are evicted result_ttl seconds after they end.
+
+A job kind is a top-level function taking the job's params dict and returning
+a JSON-serializable result; raise JobError for bad params.
+"""
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from multiprocessing.connection import wait as wait_ready
+from typing import Callable, Dict, Optional
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+# Seconds between dispatcher checks for results, cancellations and deadlines
+POLL_INTERVAL = 0.1
+
+# Seconds between evictions of expired results
+EVICT_INTERVAL = 30.0
+
+# Added to the niceness of job processes so they yield the CPU to request handling
+JOB_NICENESS = 10
+
+JOB_COLUMNS = ('id', 'kind', 'status', 'submitted_at', 'started_at', 'finished_at', 'deadline', 'result', 'error',
+               'cancel_requested')
+
+class JobError(ValueError):
+    """Raised for a job that can't be submitted or a job kind given bad params"""
+
+class QueueFull(JobError):
+    """Raised when a server process already has as many jobs as it will hold"""
+
+def create_jobs_table(cursor):
+    """Create the job results table in the catalog database"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            submitted_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            deadline REAL NOT NULL,
+            result TEXT,  -- JSON string
+            error TEXT,
+            cancel_requested INTEGER DEFAULT 0,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_expires_at ON jobs (expires_at)')
+
+def run_job(function: Callable[[dict], dict], params: dict, conn):
+    """Job process entry point: run the job and send back ('ok', result) or ('error', message)"""
+    if hasattr(os, 'nice'):
+        os.nice(JOB_NICENESS)
+    try:
+        outcome = ('ok', function(params))
+    except JobError as e:
+        outcome = ('error', str(e))
+    except Exception as e:
+        logger.exception('Job %s failed', function.__name__)
+        outcome = ('error', f'{type(e).__name__}: {e}')
+    conn.send(outcome)
+    conn.close()
+
+def job_dict(row: tuple) -> dict:
+    """Render a jobs row for the API"""
+    job = dict(zip(JOB_COLUMNS, row))
+    job['job_id'] = job.pop('id')
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+class JobQueue:
+    """Jobs submitted to one server process, run in child processes by a dispatcher thread"""
+
+    def __init__(self, database: str, max_workers: int = 1, max_pending: int = 16, result_ttl: float = 600.0):
+        self.database = database
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        # Job kind name -> function run in the job process
+        self.kinds: Dict[str, Callable[[dict], dict]] = {}
+        self._queued = deque()
+        self._jobs = {}  # job id -> (function, params, deadline) until it is started
+        self._running = {}  # job id -> (process, connection, deadline)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._dispatcher = None
+        self._context = None
+
+    def _connect(self):
+        return storage.connect(self.database, timeout=30)
+
+    def _process_context(self):
+        if self._context is None:
+            methods = multiprocessing.get_all_start_methods()
+            # Job processes come from a clean server process, not a fork of this multithreaded one
+            self._context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if 'forkserver' in methods:
+                # The main module is imported once by the server instead of by every job process
+                self._context.set_forkserver_preload(['__main__', __name__])
+        return self._context
+
+    def submit(self, kind: str, params: dict, timeout: float) -> dict:
+        """Queue a job that must finish within timeout seconds of now"""
+        function = self.kinds.get(kind)
+        if function is None:
+            raise JobError(f'kind must be one of {", ".join(sorted(self.kinds))}')
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        deadline = now + timeout
+
+        with self._lock:
+            if len(self._queued) + len(self._running) >= self.max_pending:
+                raise QueueFull('Too many jobs in progress, try again later')
+            conn = self._connect()
+            try:
+                # Expires on its own if this process dies before finishing it
+                conn.execute('INSERT INTO jobs (id, kind, status, submitted_at, deadline, expires_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (job_id, kind, QUEUED, now, deadline, deadline + self.result_ttl))
+                conn.commit()
+            finally:
+                conn.close()
+            self._jobs[job_id] = (function, params, deadline)
+            self._queued.append(job_id)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+                self._dispatcher.start()
+                atexit.register(self.shutdown)
+            self._changed.notify_all()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Current state of a job, or None if it is unknown or its result has expired"""
+        conn = self._connect()
+        try:
+            row = conn.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id = ? AND expires_at >= ?',
+                               (job_id, time.time())).fetchone()
+        finally:
+            conn.close()
+        return job_dict(row) if row else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long-poll: the job's state once it has finished or timeout seconds have passed"""
+        give_up = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = give_up - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            # Woken early by this process's dispatcher; jobs run by other processes are polled
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_INTERVAL * 5))
+
+    def cancel(self, job_id: str, timeout: float = 2.0) -> Optional[dict]:
+        """Ask for a queued or running job to be stopped, and wait briefly for it to stop"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)',
+                         (job_id, QUEUED, RUNNING))
+            conn.commit()
+        finally:
+            conn.close()
+        return self.wait(job_id, timeout)
+
+    def shutdown(self):
+        """Stop every job this process is running"""
+        with self._lock:
+            running = list(self._running)
+        for job_id in running:
+            self._stop(job_id, CANCELLED, 'Server shut down')
+
+    def _dispatch(self):
+        evicted_at = 0.0
+        while True:
+            try:
+                self._check_requests()
+                self._start_queued()
+                self._collect()
+                if time.time() - evicted_at > EVICT_INTERVAL:
+                    self._evict()
+                    evicted_at = time.time()
+            except Exception:
+                logger.exception('Job dispatcher error, will retry')
+                time.sleep(1.0)
+
+            with self._changed:
+                if not self._queued and not self._running:
+                    self._changed.wait(EVICT_INTERVAL)
+
+    def _check_requests(self):
+        """Stop jobs that were cancelled, by any process, or have passed their deadline"""
+        with self._lock:
+            job_ids = list(self._queued) + list(self._running)
+        if not job_ids:
+            return
+        conn = self._connect()
+        try:
+            cancelled = {row[0] for row in conn.execute(
+                f'SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({", ".join("?" for _ in job_ids)})',
+                job_ids)}
+        finally:
+            conn.close()
+
+        now = time.time()
+        for job_id in job_ids:
+            with self._lock:
+                entry = self._jobs.get(job_id) or self._running.get(job_id)
+            if entry is None:
+                continue
+            if job_id in cancelled:
+                self._stop(job_id, CANCELLED, 'Cancelled')
+            elif now > entry[-1]:
+                self._stop(job_id, TIMED_OUT, 'Deadline exceeded')
+
+    def _start_queued(self):
+        while True:
+            with self._lock:
+                if not self._queued or len(self._running) >= self.max_workers:
+                    return
+                job_id = self._queued.popleft()
+                function, params, deadline = self._jobs.pop(job_id)
+                context = self._process_context()
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=run_job, args=(function, params, sender), name=f'job-{job_id}',
+                                          daemon=True)
+                try:
+                    process.start()
+                except (OSError, RuntimeError) as e:
+                    logger.exception('Could not start job %s', job_id)
+                    receiver.close()
+                    sender.close()
+                    error = f'Job process failed to start: {e}'
+                else:
+                    # Only the job process writes; closing our end lets a crash show up as EOF
+                    sender.close()
+                    self._running[job_id] = (process, receiver, deadline)
+                    error = None
+            if error:
+                self._finish(job_id, FAILED, error=error)
+            else:
+                self._update(job_id, status=RUNNING, started_at=time.time())
+
+    def _collect(self):
+        """Wait briefly for running jobs to report, and record what they sent"""
+        with self._lock:
+            connections = {entry[1]: job_id for job_id, entry in self._running.items()}
+        if not connections:
+            return
+        for connection in wait_ready(list(connections), POLL_INTERVAL):
+            job_id = connections[connection]
+            with self._lock:
+                entry = self._running.pop(job_id, None)
+            if entry is None:
+                # Stopped meanwhile
+                continue
+            process = entry[0]
+            try:
+                outcome, value = connection.recv()
+            except EOFError:
+                outcome, value = 'error', None
+            connection.close()
+            process.join()
+            if outcome == 'ok':
+                self._finish(job_id, SUCCEEDED, result=value)
+            else:
+                self._finish(job_id, FAILED, error=value or f'Job process exited with code {process.exitcode}')
+
+    def _stop(self, job_id: str, status: str, error: str):
+        with self._lock:
+            entry = self._running.pop(job_id, None)
+            if job_id in self._jobs:
+                del self._jobs[job_id]
+                self._queued.remove(job_id)
+        if entry is not None:
+            process, connection, _ = entry
+            process.terminate()
+            process.join(1.0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            connection.close()
+        self._finish(job_id, status, error=error)
+
+    def _finish(self, job_id: str, status: str, result=None, error: Optional[str] = None):
+        now = time.time()
+        self._update(job_id, status=status, finished_at=now, expires_at=now + self.result_ttl,
+                     result=json.dumps(result) if result is not None else None, error=error)
+
+    def _update(self, job_id: str, **columns):
+        conn = self._connect()
+        try:
+            conn.execute(f'UPDATE jobs SET {", ".join(f"{column} = ?" for column in columns)} WHERE id = ?',
+                         (*columns.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._changed:
+            self._changed.notify_all()
+
+    def _evict(self):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM jobs WHERE expires_at < ?', (time.time(),))
+            conn.commit()
+        finally:
+            conn.close()
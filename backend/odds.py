@@ -0,0 +1,124 @@
+"""Exact draw odds for a session's deck, from multivariate hypergeometric counts.
+
+Only how many cards of each type a deck holds matters, so every probability
+here is computed from per-type counts: the type codes are read straight out of
+the packed zones, and binomial coefficients for every card type and draw size
+come from one cumulative product, so a 200-card deck costs the same handful of
+array operations as a 30-card one.
+
+A hand is "playable" when it holds at least one play card, the cards that
+actually gain yards.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from catalog import CARD_TYPES
+from snapshot import CARD_REF, TYPE_CODES
+
+def type_counts(*packed_zones: bytes) -> np.ndarray:
+    """Cards of each type across packed zones, indexed by type code"""
+    codes = np.frombuffer(b''.join(packed_zones), dtype=np.uint8)[::CARD_REF.size]
+    return np.bincount(codes, minlength=len(CARD_TYPES))[:len(CARD_TYPES)]
+
+def binomials(totals: np.ndarray, max_k: int) -> np.ndarray:
+    """C(total, k) for every total and k = 0..max_k, as floats of shape (len(totals), max_k + 1)"""
+    totals = np.asarray(totals, dtype=np.float64)[:, None]
+    k = np.arange(max_k, dtype=np.float64)[None, :]
+    steps = np.clip((totals - k) / (k + 1), 0, None)
+    return np.hstack([np.ones((totals.shape[0], 1)), np.cumprod(steps, axis=1)])
+
+def miss_chance(size: int, hits: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """Chance that draws cards from a deck of size cards include none of its hits cards,
+    for every (hits, draws) pair: C(size - hits, draws) / C(size, draws)"""
+    hits = np.asarray(hits)[:, None]
+    draws = np.asarray(draws)
+    i = np.arange(max(int(draws.max(initial=0)), 1), dtype=np.float64)[None, :]
+    # Product of (size - hits - i) / (size - i) over the first draws cards
+    steps = np.clip((size - hits - i) / np.maximum(size - i, 1), 0, None)
+    products = np.hstack([np.ones((hits.shape[0], 1)), np.cumprod(steps, axis=1)])
+    return products[:, np.minimum(draws, size)]
+
+def by_type(values) -> Dict[str, float]:
+    return {card_type: round(float(values[TYPE_CODES[card_type]]), 4) for card_type in CARD_TYPES}
+
+def hand_odds(counts: np.ndarray, hand_size: int) -> dict:
+    """Odds for a hand of hand_size cards drawn from a freshly shuffled deck"""
+    size = int(counts.sum())
+    hand_size = min(hand_size, size)
+    player, play, modifier = (TYPE_CODES[card_type] for card_type in ('player', 'play', 'modifier'))
+
+    # P(players, plays, modifiers) for every split of the hand, as one outer product of binomial tables
+    table = binomials(counts, hand_size)
+    grid = table[player][:, None, None] * table[play][None, :, None] * table[modifier][None, None, :]
+    index = np.indices(grid.shape)
+    grid = np.where(index.sum(axis=0) == hand_size, grid, 0) / binomials([size], hand_size)[0, hand_size]
+
+    splits = [(int(p), int(q), int(m), float(grid[p, q, m])) for p, q, m in zip(*np.nonzero(grid))]
+    splits.sort(key=lambda split: split[3], reverse=True)
+    return {
+        'at_least_one': by_type(1 - miss_chance(size, counts, np.array([hand_size]))[:, 0]),
+        'expected': by_type(counts * hand_size / size),
+        'playable': round(float(grid[:, 1:, :].sum()), 4),
+        'playable_with_player': round(float(grid[1:, 1:, :].sum()), 4),
+        'splits': [{'player': p, 'play': q, 'modifier': m, 'probability': round(probability, 4)}
+                   for p, q, m, probability in splits],
+    }
+
+def mulligan_odds(counts: np.ndarray, hand_size: int) -> dict:
+    """Odds that an opening hand is playable once a hand without plays is mulliganed once.
+    A mulligan draws from the rest of the deck, so both hands together are 2 * hand_size cards."""
+    size = int(counts.sum())
+    plays = counts[TYPE_CODES['play']]
+    if size < 2 * hand_size:
+        # The second hand would come partly from a reshuffled discard pile
+        return {'needed': None, 'playable': None}
+    misses = miss_chance(size, np.array([plays]), np.array([hand_size, 2 * hand_size]))[0]
+    return {'needed': round(float(misses[0]), 4), 'playable': round(float(1 - misses[1]), 4)}
+
+def current_mulligan_odds(draw_pile: np.ndarray, discards: np.ndarray, hand_size: int) -> float:
+    """Chance that a mulligan right now draws a playable hand: the draw pile's cards first, then cards from
+    the discard pile reshuffled with the current hand if the draw pile runs out"""
+    plays = TYPE_CODES['play']
+    remaining = int(draw_pile.sum())
+    if remaining >= hand_size:
+        miss = miss_chance(remaining, draw_pile[[plays]], np.array([hand_size]))[0, 0]
+    else:
+        # Every remaining card is drawn, the rest of the hand comes from the reshuffle
+        reshuffled = int(discards.sum())
+        miss = 0.0 if draw_pile[plays] else miss_chance(reshuffled, discards[[plays]],
+                                                         np.array([min(hand_size - remaining, reshuffled)]))[0, 0]
+    return round(float(1 - miss), 4)
+
+def drive_odds(counts: np.ndarray, hand_size: int, drives: int) -> List[dict]:
+    """Cards of each type expected to have been drawn by the end of each drive, when every drive draws
+    hand_size new cards from one shuffle of the deck, and the chance a play has turned up by then"""
+    size = int(counts.sum())
+    drawn = np.minimum(np.arange(1, drives + 1) * hand_size, size)
+    drawn = drawn[:int(np.searchsorted(drawn, size)) + 1]
+    expected = counts[:, None] * drawn[None, :] / size
+    play_seen = 1 - miss_chance(size, counts[[TYPE_CODES['play']]], drawn)[0]
+    return [{'drive': drive, 'cards_drawn': int(cards), 'expected': by_type(expected[:, drive - 1]),
+             'play_seen': round(float(play_seen[drive - 1]), 4)}
+            for drive, cards in enumerate(drawn, 1)]
+
+def deck_odds(deck_cards: bytes, hand: bytes, discard_pile: bytes, hand_size: int, drives: int) -> dict:
+    """Draw odds for a session's packed zones: opening hands from the whole deck shuffled, and a mulligan
+    from where the session stands now"""
+    draw_pile = type_counts(deck_cards)
+    discards = type_counts(hand, discard_pile)
+    counts = draw_pile + discards
+    size = int(counts.sum())
+    odds = {
+        'deck_size': size,
+        'composition': {card_type: int(counts[TYPE_CODES[card_type]]) for card_type in CARD_TYPES},
+        'hand_size': hand_size,
+    }
+    if not size:
+        return dict(odds, opening_hand=None, mulligan=None, mulligan_now=None, by_drive=[])
+    return dict(odds, **{
+        'opening_hand': hand_odds(counts, hand_size),
+        'mulligan': mulligan_odds(counts, hand_size),
+        'mulligan_now': current_mulligan_odds(draw_pile, discards, hand_size),
+        'by_drive': drive_odds(counts, hand_size, drives),
+    })
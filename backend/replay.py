@@ -0,0 +1,209 @@
+"""Offline verification of submitted drives by replaying them.
+
+play_drive logs every drive to session_actions: the cards exactly as the client
+sent them, the hand they were played from and the result the server computed.
+This job re-executes each logged drive from the session's rng stream with the
+catalog version the session is pinned to, and flags
+
+    cards     a played card that wasn't in the hand
+    stats     a played card whose data doesn't match the catalog
+    outcome   a result that differs from replaying the drive with catalog cards
+
+Pending drives are read in batches and scored in parallel across a process
+pool; each drive is marked verified so reruns only pick up new ones.
+
+    python replay.py verify [--workers 4] [--batch-size 1000] [--all] [--report verify_report.json]
+
+With --workers 1 drives are verified in this process instead of a pool.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Tuple
+
+import storage
+from catalog import CatalogRegistry
+from scoring import calculate_drive_score, session_rng
+from shards import ShardRouter
+from synergy import build_synergy_matrix
+
+# session_actions.verified states
+PENDING = 0
+MATCHED = 1
+MISMATCH = -1
+NOT_REPLAYABLE = 2
+
+RESULT_KEYS = ('drive_score', 'drive_successful', 'yards_gained', 'points_scored', 'turnover', 'downs_used',
+               'first_down')
+
+def drive_payload(cards: list, hand: list, game_state: dict, result: dict) -> dict:
+    """The session_actions payload of one drive: the cards as played, the hand refs and game state it was played
+    from, and the result fields replay compares"""
+    return {'cards': cards, 'hand': hand, 'game_state': game_state,
+            'result': {key: result[key] for key in RESULT_KEYS}}
+
+# Catalog registry for each pool worker, set up by init_worker
+_catalogs = None
+
+def init_worker(catalog_path: str, database: str):
+    global _catalogs
+    _catalogs = CatalogRegistry(catalog_path, database)
+    _catalogs.on_build.append(build_synergy_matrix)
+
+def verify_drive(catalog, seed, rng_step, payload) -> Tuple[int, List[dict]]:
+    """Check one logged drive, returning its verified state and any mismatches"""
+    if seed is None:
+        # Session predates tracked rng state, so its rolls can't be reproduced
+        return NOT_REPLAYABLE, []
+
+    mismatches = []
+    available = Counter(tuple(ref) for ref in payload['hand'])
+    canonical = []
+    for index, card in enumerate(payload['cards']):
+        card_id = card.get('id')
+        ref = (card.get('type'), card_id if isinstance(card_id, int) else None)
+        if available[ref] > 0:
+            available[ref] -= 1
+        else:
+            mismatches.append({'kind': 'cards', 'index': index, 'card': list(ref)})
+
+        catalog_card = catalog.get(*ref)
+        if catalog_card is None:
+            mismatches.append({'kind': 'stats', 'index': index, 'card': list(ref), 'reason': 'not in catalog'})
+            canonical.append(card)
+            continue
+        if card.get('data') != catalog_card['data'] or card.get('synergy_tags') != catalog_card['synergy_tags']:
+            mismatches.append({'kind': 'stats', 'index': index, 'card': list(ref)})
+        canonical.append(catalog_card)
+
+    replayed = calculate_drive_score(canonical, payload['game_state'], session_rng(seed, rng_step),
+                                     catalog.indexes.get('synergy'))
+    recorded = payload['result']
+    differing = [key for key in RESULT_KEYS if replayed[key] != recorded.get(key)]
+    if differing:
+        mismatches.append({'kind': 'outcome', 'fields': differing,
+                           'recorded': {key: recorded.get(key) for key in differing},
+                           'replayed': {key: replayed[key] for key in differing}})
+
+    return (MISMATCH if mismatches else MATCHED), mismatches
+
+def verify_batch(rows):
+    """Pool task: verify (session_id, rng_step, payload, seed, catalog_version) rows"""
+    results = []
+    for session_id, rng_step, payload, seed, catalog_version in rows:
+        state, mismatches = verify_drive(_catalogs.get(catalog_version), seed, rng_step, json.loads(payload))
+        results.append((session_id, rng_step, state, mismatches))
+    return results
+
+def pending_batches(conn, batch_size, include_verified):
+    """Read logged drives with their session's seed and catalog version, in batches"""
+    # Page by key so no read is left open while verified flags are written
+    last = (-1, -1)
+    while True:
+        rows = conn.execute(f'''
+            SELECT a.session_id, a.rng_step, a.payload, s.rng_seed, s.catalog_version
+            FROM session_actions a JOIN game_sessions s ON s.id = a.session_id
+            WHERE a.action = 'drive' AND (a.session_id, a.rng_step) > (?, ?)
+                {'' if include_verified else 'AND a.verified = 0'}
+            ORDER BY a.session_id, a.rng_step
+            LIMIT ?
+        ''', (*last, batch_size)).fetchall()
+        if not rows:
+            return
+        last = rows[-1][:2]
+        yield rows
+
+def verify(database: str, shard_count: int, catalog_path: str, workers: int, batch_size: int,
+           include_verified: bool = False) -> dict:
+    """Verify every pending drive in every shard and return a summary report"""
+    router = ShardRouter(database, shard_count)
+    counts = Counter()
+    flagged = []
+    started = time.perf_counter()
+
+    def record(conn, results):
+        conn.executemany('UPDATE session_actions SET verified = ? WHERE session_id = ? AND rng_step = ?',
+                         [(state, session_id, rng_step) for session_id, rng_step, state, _ in results])
+        conn.commit()
+        for session_id, rng_step, state, mismatches in results:
+            counts[state] += 1
+            if mismatches:
+                flagged.append({'session_id': session_id, 'rng_step': rng_step, 'mismatches': mismatches})
+
+    if workers <= 1:
+        # Verify in this process, e.g. from a background job that can't start a pool of its own
+        init_worker(catalog_path, database)
+        for path in router.shard_paths():
+            conn = storage.connect(path, timeout=30)
+            for rows in pending_batches(conn, batch_size, include_verified):
+                record(conn, verify_batch(rows))
+            conn.close()
+        return summary(counts, flagged, started)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(catalog_path, database)) as pool:
+        for path in router.shard_paths():
+            conn = storage.connect(path, timeout=30)
+            # Keep a bounded number of batches in flight so memory doesn't grow with the backlog
+            in_flight = set()
+            for rows in pending_batches(conn, batch_size, include_verified):
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(conn, future.result())
+                in_flight.add(pool.submit(verify_batch, rows))
+            for future in in_flight:
+                record(conn, future.result())
+            conn.close()
+    return summary(counts, flagged, started)
+
+def summary(counts: Counter, flagged: List[dict], started: float) -> dict:
+    """The report of a verification run"""
+    elapsed = time.perf_counter() - started
+    drives = sum(counts.values())
+    return {
+        'drives': drives,
+        'matched': counts[MATCHED],
+        'mismatched': counts[MISMATCH],
+        'not_replayable': counts[NOT_REPLAYABLE],
+        'mismatch_kinds': dict(Counter(m['kind'] for drive in flagged for m in drive['mismatches'])),
+        'elapsed_seconds': round(elapsed, 2),
+        'drives_per_second': round(drives / elapsed, 1) if elapsed else 0,
+        'flagged': flagged,
+    }
+
+def verify_job(params: dict) -> dict:
+    """Background job (see jobs.py): verify pending drives and report at most flag_limit flagged ones"""
+    report = verify(params['database'], params['shards'], params['catalog_path'], workers=1,
+                    batch_size=1000, include_verified=bool(params.get('all')))
+    report['flagged'] = report['flagged'][:max(0, int(params.get('flag_limit', 100)))]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline drive replay verification')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    verify_parser = subparsers.add_parser('verify', help='replay logged drives and flag mismatches')
+    verify_parser.add_argument('--database', default=os.environ.get('DATABASE_PATH', 'fantasy_football.db'))
+    verify_parser.add_argument('--shards', type=int, default=int(os.environ.get('SESSION_SHARDS', 1)))
+    verify_parser.add_argument('--catalog', default=os.environ.get(
+        'CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cards.json')))
+    verify_parser.add_argument('--workers', type=int, default=os.cpu_count())
+    verify_parser.add_argument('--batch-size', type=int, default=1000)
+    verify_parser.add_argument('--all', action='store_true', help='re-verify drives that were already checked')
+    verify_parser.add_argument('--report', default='verify_report.json')
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        report = verify(args.database, args.shards, args.catalog, args.workers, args.batch_size, args.all)
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Verified {report['drives']} drives in {report['elapsed_seconds']}s "
+              f"({report['drives_per_second']} drives/s): {report['matched']} matched, "
+              f"{report['mismatched']} mismatched, {report['not_replayable']} not replayable")
+        print(f"report written to {args.report}")
+
+if __name__ == '__main__':
+    main()
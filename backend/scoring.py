@@ -0,0 +1,266 @@
+"""Drive scoring and progression rules, shared by the API and offline replay.
+
+Everything here is a pure function of its arguments plus the random generator
+passed in, so a drive can be re-executed exactly from the session's rng stream.
+"""
+import random
+
+def session_rng(seed, step):
+    """Get the random generator for one step of a session's rng stream"""
+    if seed is None:
+        # Sessions created before rng state was tracked
+        return random.Random()
+    return random.Random(f'{seed}:{step}')
+
+def advance_downs(situation, drive_result):
+    """Apply a drive result to (down, distance, yards to go) and return the new situation"""
+    current_down, current_distance, yards_to_go = situation
+    new_down = current_down + drive_result['downs_used']
+    new_distance = current_distance + drive_result['yards_gained']
+    
+    # Check if we got a first down
+    if drive_result['first_down'] or new_distance >= yards_to_go:
+        # First down! Reset to 1st & 10
+        new_down = 1
+        new_distance = 0
+        yards_to_go = 10
+    elif new_down > 4:
+        # Turnover on downs
+        new_down = 1
+        new_distance = 0
+        yards_to_go = 10
+        drive_result['drive_successful'] = False
+        drive_result['turnover'] = True
+    
+    return new_down, new_distance, yards_to_go
+
+def advance_progress(progress, drive_successful):
+    """Advance drive, game and season counters after a drive"""
+    progress['drives_completed'] += 1
+    
+    # A failed drive ends the game where it is
+    if not drive_successful:
+        return progress
+    
+    if progress['current_drive'] < progress['total_drives_in_game']:
+        # Next drive in same game
+        progress['current_drive'] += 1
+        return progress
+    
+    # Game completed!
+    progress['games_won'] += 1
+    
+    if progress['current_game'] < progress['total_games_in_season']:
+        # Next game in same season
+        progress['current_game'] += 1
+        progress['current_drive'] = 1
+        progress['drives_completed'] = 0
+    elif progress['games_won'] == progress['total_games_in_season']:
+        # Season completed with every game won
+        progress['seasons_won'] += 1
+        if progress['current_season'] < progress['total_seasons']:
+            # Start new season
+            progress['current_season'] += 1
+            progress['current_game'] = 1
+            progress['current_drive'] = 1
+            progress['drives_completed'] = 0
+            progress['games_won'] = 0
+        # Otherwise all seasons are completed - Championship won!
+    
+    return progress
+
+def defense_rating(game_state):
+    """Calculate defensive rating based on game progression"""
+    rating = 50  # Base defense
+    if game_state:
+        season = game_state.get('season', 1)
+        game = game_state.get('game', 1)
+        rating += (season - 1) * 10 + (game - 1) * 5
+    return rating
+
+def play_success_chance(risk, defense, pressure_level):
+    """Highest d100 roll at which a play still succeeds"""
+    return max(10, 100 - (risk * defense / 100) - pressure_level)
+
+class SuccessfulRolls:
+    """Stand-in random generator whose every roll succeeds"""
+
+    def randint(self, low, high):
+        return low
+
+def expected_drive_score(cards_played, game_state=None, synergy=None):
+    """Mean score of playing cards in this order: any failed play scores nothing, so it is the score
+    when every play succeeds times the chance that they all do"""
+    defense = defense_rating(game_state)
+    chance = 1.0
+    for i, card in enumerate(cards_played):
+        if card.get('type') == 'play':
+            risk = card.get('data', {}).get('base_stats', {}).get('risk', 50)
+            # Pressure builds by 5 with each card, as in calculate_drive_score
+            chance *= min(100, int(play_success_chance(risk, defense, 5 * (i + 1)))) / 100
+    if not chance:
+        return 0.0
+    return chance * calculate_drive_score(cards_played, game_state, SuccessfulRolls(), synergy)['drive_score']
+
+def calculate_drive_score(cards_played, game_state=None, rng=random, synergy=None):
+    """Calculate score and results for a drive based on cards played with defensive pressure and multipliers.
+    With the catalog's SynergyMatrix (see synergy.py), synergy bonuses are looked up instead of recomputed."""
+    if not cards_played:
+        return {
+            'drive_score': 0,
+            'cards_played': [],
+            'drive_successful': False,
+            'yards_gained': 0,
+            'points_scored': 0,
+            'turnover': False,
+            'pressure_level': 0,
+            'downs_used': 0,
+            'first_down': False
+        }
+    
+    # Initialize drive tracking
+    total_yards = 0
+    total_points = 0
+    pressure_level = 0
+    multiplier = 1.0
+    turnover = False
+    successful_plays = 0
+    downs_used = 0
+    first_down = False
+    
+    defense = defense_rating(game_state)
+    # Matrix positions of the cards, resolved when the first synergy bonus is needed
+    positions = None
+    
+    # Process each card played (each card = 1 down)
+    for i, card in enumerate(cards_played):
+        pressure_level += 5  # Pressure builds with each play
+        downs_used += 1
+        
+        if card.get('type') == 'play':
+            play_data = card.get('data', {})
+            play_stats = play_data.get('base_stats', {})
+            risk = play_stats.get('risk', 50)
+            reward = play_stats.get('reward', 50)
+            base_yards = play_stats.get('yards', 0)
+            
+            # Apply defensive pressure check
+            success_chance = play_success_chance(risk, defense, pressure_level)
+            roll = rng.randint(1, 100)
+            
+            if roll > success_chance:
+                # Play failed - turnover!
+                turnover = True
+                break
+            
+            # Play succeeded - calculate yards with multipliers
+            play_yards = base_yards * multiplier
+            total_yards += play_yards
+            successful_plays += 1
+            
+            # Check for scoring plays
+            play_name = play_data.get('name', '').lower()
+            if any(scoring_term in play_name for scoring_term in ['touchdown', 'field goal', 'hail mary']):
+                if 'touchdown' in play_name:
+                    total_points += 6
+                elif 'field goal' in play_name:
+                    total_points += 3
+                elif 'hail mary' in play_name and play_yards >= 40:
+                    total_points += 6
+            
+            # Apply synergy bonuses
+            if synergy is not None and positions is None:
+                # Cards that aren't this catalog's, as defined, fall back to calculate_synergy_bonus
+                positions = synergy.drive_positions(cards_played) or ()
+            if positions:
+                multiplier += synergy.bonus(positions, i)
+            else:
+                multiplier += calculate_synergy_bonus(card, cards_played[:i+1])
+            
+        elif card.get('type') == 'player':
+            # Players provide stat bonuses to subsequent plays
+            player_data = card.get('data', {})
+            player_stats = player_data.get('base_stats', {})
+            # Apply player bonuses to multiplier
+            multiplier += 0.1  # Base player bonus
+            
+        elif card.get('type') == 'modifier':
+            # Modifiers provide immediate effects
+            modifier_data = card.get('data', {})
+            effect = modifier_data.get('effect', {})
+            
+            if 'multiplier_boost' in effect:
+                multiplier += effect['multiplier_boost']
+            if 'scoring_multiplier' in effect:
+                multiplier *= effect['scoring_multiplier']
+    
+    # Check for first down (10+ yards gained)
+    if total_yards >= 10:
+        first_down = True
+    
+    # Calculate final score
+    base_score = successful_plays * 10
+    yard_bonus = total_yards * multiplier
+    point_bonus = total_points * 20
+    
+    # Drive is successful if we gain at least 10 yards, score points, or get a first down
+    drive_successful = not turnover and (total_yards >= 10 or total_points > 0 or first_down)
+    
+    if drive_successful:
+        final_score = base_score + yard_bonus + point_bonus
+    else:
+        final_score = 0  # Failed drives give no points
+    
+    return {
+        'drive_score': int(final_score),
+        'cards_played': cards_played,
+        'drive_successful': drive_successful,
+        'yards_gained': int(total_yards),
+        'points_scored': total_points,
+        'turnover': turnover,
+        'pressure_level': pressure_level,
+        'multiplier': multiplier,
+        'successful_plays': successful_plays,
+        'downs_used': downs_used,
+        'first_down': first_down
+    }
+
+def calculate_synergy_bonus(card, all_cards_played):
+    """Calculate synergy bonus for a card based on other cards played"""
+    bonus = 0.0
+    
+    if not card.get('synergy_tags'):
+        return bonus
+    
+    card_tags = card['synergy_tags']
+    
+    # Count matching synergy tags
+    for other_card in all_cards_played[:-1]:  # Exclude current card
+        if other_card.get('synergy_tags'):
+            matching_tags = set(card_tags) & set(other_card['synergy_tags'])
+            bonus += len(matching_tags) * 0.1  # 0.1x per matching tag
+    
+    # Position synergy bonuses
+    if card.get('type') == 'play':
+        play_type = card.get('data', {}).get('play_type', '')
+        
+        # Count players of matching positions
+        qb_count = sum(1 for c in all_cards_played if c.get('type') == 'player' and c.get('data', {}).get('position') == 'QB')
+        wr_count = sum(1 for c in all_cards_played if c.get('type') == 'player' and c.get('data', {}).get('position') == 'WR')
+        rb_count = sum(1 for c in all_cards_played if c.get('type') == 'player' and c.get('data', {}).get('position') == 'RB')
+        
+        if play_type == 'passing' and qb_count > 0:
+            bonus += 0.2 * qb_count
+        if play_type == 'passing' and wr_count > 0:
+            bonus += 0.15 * wr_count
+        if play_type == 'rushing' and rb_count > 0:
+            bonus += 0.2 * rb_count
+    
+    # Rarity bonuses
+    rarity = card.get('data', {}).get('rarity', 'common')
+    if rarity == 'epic':
+        bonus += 0.3
+    elif rarity == 'legendary':
+        bonus += 0.5
+    
+    return bonus
@@ -0,0 +1,183 @@
+"""In-memory search indexes over one catalog version.
+
+Indexes are built once per catalog version (see CatalogRegistry.on_build) and
+never change afterwards. Every card gets a position in a fixed order (type, then
+catalog id); the indexes map to sorted position lists, so a query walks its most
+selective index from the cursor position and stops once the page is full.
+"""
+import base64
+import binascii
+import json
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+from catalog import CARD_TYPES, Catalog
+
+# Fields that can be filtered with an exact (comma-separated) match
+HASH_FIELDS = ('type', 'position', 'rarity', 'team', 'tag')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+class SearchError(ValueError):
+    """Raised for a query the index can't answer"""
+
+def name_tokens(name: str) -> List[str]:
+    """Lowercased words of a card name, plus the whole name so multi-word prefixes match"""
+    name = name.lower()
+    words = re.findall(r'[a-z0-9]+', name)
+    return [name] + [word for word in words if word != name]
+
+class NameTrie:
+    """Prefix trie over card names; every node keeps the sorted positions below it"""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, token: str, position: int):
+        node = self.root
+        for char in token:
+            node = node.setdefault(char, {})
+            positions = node.setdefault('', [])
+            # Several tokens of one name can share a prefix
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+    def positions(self, prefix: str) -> List[int]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+class CardIndex:
+    """Name trie, hash indexes and a cost-sorted array for one catalog version"""
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.version = catalog.version
+        cards = [card for card_type in CARD_TYPES for card in catalog.cards_of_type(card_type)]
+        # Only refs are kept, so a mapped catalog isn't fully hydrated by its index
+        self.refs = [(card['type'], card['id']) for card in cards]
+        self.costs = [card['data']['cost'] for card in cards]
+        self.fields = sorted({field for card in cards for field in card['data']})
+        self.names = NameTrie()
+        self.hashes: Dict[str, Dict[str, List[int]]] = {field: {} for field in HASH_FIELDS}
+
+        for position, card in enumerate(cards):
+            data = card['data']
+            for token in name_tokens(data['name']):
+                self.names.add(token, position)
+            self.hashes['type'].setdefault(card['type'], []).append(position)
+            for field in ('position', 'rarity', 'team'):
+                if field in data:
+                    self.hashes[field].setdefault(str(data[field]).lower(), []).append(position)
+            for tag in set(card['synergy_tags']):
+                self.hashes['tag'].setdefault(tag.lower(), []).append(position)
+
+        # (cost, position) pairs sorted by cost for range queries
+        self.by_cost = sorted((cost, position) for position, cost in enumerate(self.costs))
+
+    def cost_range(self, min_cost: Optional[int], max_cost: Optional[int]) -> List[int]:
+        start = 0 if min_cost is None else bisect_left(self.by_cost, (min_cost, -1))
+        end = len(self.by_cost) if max_cost is None else bisect_right(self.by_cost, (max_cost, len(self.refs)))
+        return sorted(position for _, position in self.by_cost[start:end])
+
+    def search(self, filters: Dict[str, List[str]], prefix: Optional[str] = None, min_cost: Optional[int] = None,
+               max_cost: Optional[int] = None, after: int = -1, limit: int = DEFAULT_LIMIT):
+        """Return (positions of one page, whether more matches follow)"""
+        candidates = []
+        for field, values in filters.items():
+            if len(values) == 1:
+                candidates.append(self.hashes[field].get(values[0], []))
+            else:
+                candidates.append(sorted({p for value in values for p in self.hashes[field].get(value, [])}))
+        if prefix:
+            candidates.append(self.names.positions(prefix.lower()))
+
+        def cost_ok(position):
+            cost = self.costs[position]
+            return (min_cost is None or cost >= min_cost) and (max_cost is None or cost <= max_cost)
+        has_cost = min_cost is not None or max_cost is not None
+
+        if candidates:
+            # Walk the smallest candidate list and test the rest by membership
+            candidates.sort(key=len)
+            driver = candidates[0]
+            others = [set(positions) for positions in candidates[1:]]
+        elif has_cost:
+            driver, others, has_cost = self.cost_range(min_cost, max_cost), [], False
+        else:
+            driver, others = range(len(self.refs)), []
+
+        page = []
+        for index in range(bisect_right(driver, after), len(driver)):
+            position = driver[index]
+            if all(position in other for other in others) and (not has_cost or cost_ok(position)):
+                if len(page) == limit:
+                    return page, True
+                page.append(position)
+        return page, False
+
+    def card(self, position: int) -> dict:
+        return self.catalog.get(*self.refs[position])
+
+    def project(self, position: int, fields: Optional[List[str]]) -> dict:
+        """The card at a position, with its data cut down to the requested fields"""
+        card = self.card(position)
+        if fields is None:
+            return card
+        return {'id': card['id'], 'type': card['type'], 'data': {field: card['data'][field]
+                                                                  for field in fields if field in card['data']}}
+
+def build_search_index(catalog: Catalog):
+    """CatalogRegistry build hook - index each catalog version as it is built"""
+    catalog.indexes['search'] = CardIndex(catalog)
+
+def encode_cursor(version: str, position: int) -> str:
+    payload = json.dumps([version, position]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Return the (catalog version, last position) a cursor points after"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        version, position = json.loads(payload)
+        return str(version), int(position)
+    except (binascii.Error, ValueError, TypeError):
+        raise SearchError('Invalid cursor')
+
+def parse_query(args, index: CardIndex) -> dict:
+    """Turn request args into CardIndex.search keyword arguments plus the field projection"""
+    filters = {}
+    for field in HASH_FIELDS:
+        value = args.get(field)
+        if value:
+            filters[field] = [item.strip().lower() for item in value.split(',') if item.strip()]
+
+    try:
+        min_cost = int(args['min_cost']) if args.get('min_cost') else None
+        max_cost = int(args['max_cost']) if args.get('max_cost') else None
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise SearchError('min_cost, max_cost and limit must be integers')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise SearchError(f'limit must be between 1 and {MAX_LIMIT}')
+
+    fields = None
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = sorted(set(fields) - set(index.fields))
+        if unknown:
+            raise SearchError(f'Unknown fields: {", ".join(unknown)}')
+
+    return {
+        'filters': filters,
+        'prefix': args.get('q', '').strip() or None,
+        'min_cost': min_cost,
+        'max_cost': max_cost,
+        'limit': limit,
+        'fields': fields,
+    }
@@ -0,0 +1,87 @@
+"""Production serving for the backend.
+
+`python app.py --production` (or SERVER_MODE=production) serves the app from a
+production WSGI server instead of the Werkzeug dev server: gunicorn with
+threaded worker processes on Linux and macOS, waitress on Windows, where
+gunicorn doesn't run. Each worker builds and warms its own app with create_app()
+and starts its own catalog watcher; the catalog itself is shared through the
+mapped catalog files.
+
+Tuning comes from the environment:
+
+    WEB_WORKERS             worker processes (default 2 x CPUs + 1; gunicorn only)
+    WEB_THREADS             threads per worker (default 4)
+    WEB_KEEPALIVE           seconds to keep idle connections open (default 5)
+    WEB_TIMEOUT             seconds before a stuck worker is restarted (default 30)
+    WEB_GRACEFUL_TIMEOUT    seconds workers get to finish requests on restart (default 30)
+    WEB_MAX_REQUESTS        recycle a worker after this many requests, 0 = never (default 0)
+    MAX_REQUEST_BYTES       largest accepted request body (default 1 MiB)
+
+With gunicorn, send SIGHUP to the master for a graceful restart: new workers
+are started with the current code and config, and old ones finish their
+in-flight requests before exiting.
+"""
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+def server_options(port: int) -> dict:
+    """Serving options from the environment"""
+    return {
+        'bind': f"{os.environ.get('HOST', '0.0.0.0')}:{port}",
+        'workers': int(os.environ.get('WEB_WORKERS', 2 * (os.cpu_count() or 1) + 1)),
+        'threads': int(os.environ.get('WEB_THREADS', 4)),
+        'keepalive': int(os.environ.get('WEB_KEEPALIVE', 5)),
+        'timeout': int(os.environ.get('WEB_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)),
+        'max_requests': int(os.environ.get('WEB_MAX_REQUESTS', 0)),
+        'max_request_bytes': int(os.environ.get('MAX_REQUEST_BYTES', 1024 * 1024)),
+    }
+
+def start_catalog_watcher(worker):
+    """gunicorn post_worker_init hook"""
+    from app import catalogs
+    catalogs.watch()
+
+def run_gunicorn(options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key in ('bind', 'workers', 'threads', 'keepalive', 'timeout', 'graceful_timeout', 'max_requests'):
+                self.cfg.set(key, options[key])
+            # Spread recycling out so workers don't all restart at once
+            self.cfg.set('max_requests_jitter', options['max_requests'] // 10)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('limit_request_line', 8190)
+            self.cfg.set('limit_request_fields', 100)
+            self.cfg.set('post_worker_init', start_catalog_watcher)
+
+        def load(self):
+            # Imported here so every worker builds and warms its own app
+            from app import create_app
+            return create_app()
+
+    Server().run()
+
+def run_waitress(options: dict):
+    from waitress import serve
+    from app import catalogs, create_app
+
+    app = create_app()
+    catalogs.watch()
+    serve(app, listen=options['bind'], threads=options['threads'], channel_timeout=options['timeout'],
+          max_request_body_size=options['max_request_bytes'])
+
+def serve(port: int):
+    """Run the production server until it is stopped"""
+    options = server_options(port)
+    if sys.platform == 'win32':
+        logger.info('Serving on %s with waitress, %d threads', options['bind'], options['threads'])
+        run_waitress(options)
+    else:
+        logger.info('Serving on %s with gunicorn, %d workers x %d threads', options['bind'], options['workers'],
+                    options['threads'])
+        run_gunicorn(options)
@@ -0,0 +1,394 @@
+"""Game sessions as whole records behind one interface, stored in SQLite or in dicts.
+
+A SessionRepository creates, loads and saves the game state of one session at a
+time - its deck config, packed card zones, rng stream position, down and
+distance, score and progress counters - as a GameSession:
+
+    SQLiteSessionRepository  game_sessions rows, through a ShardRouter, so file
+                             and in-memory databases (see storage.py) both work
+    DictSessionRepository    plain Python dicts in this process, no SQLite at all
+
+Saving bumps the session's state version, logs the delta ops that produced it,
+and logs drives for replay. The API handlers do all their session reads and
+writes through a repository, so code written against one runs unchanged
+whichever it is given: thousands of isolated games can be played in-process
+without disk I/O, then the same code pointed at the server's database.
+
+A handler's load-modify-save runs inside repository.transaction(session_id),
+which for SQLite holds the shard's write lock from the load until the block
+exits, so no other process can save the session in between.
+"""
+import copy
+import json
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import storage
+from shards import ShardRouter
+from snapshot import encode_snapshot
+from tracing import span
+
+# Typed progress columns, in the order LOAD_QUERY selects them
+PROGRESS_COLUMNS = (
+    'current_season', 'current_game', 'current_drive', 'drives_completed', 'games_won', 'seasons_won',
+    'total_drives_in_game', 'total_games_in_season', 'total_seasons',
+    'career_level', 'total_score', 'championships_won', 'super_bowls_won', 'hall_of_fame_points'
+)
+
+# Column defaults of a new game_sessions row
+NEW_PROGRESS = {
+    'current_season': 1, 'current_game': 1, 'current_drive': 1, 'drives_completed': 0, 'games_won': 0,
+    'seasons_won': 0, 'total_drives_in_game': 4, 'total_games_in_season': 10, 'total_seasons': 10,
+    'career_level': 'high_school', 'total_score': 0, 'championships_won': 0, 'super_bowls_won': 0,
+    'hall_of_fame_points': 0
+}
+
+# game_sessions columns a GameSession holds besides its id, deck config and progress
+SESSION_FIELDS = ('player_name', 'deck_type', 'catalog_version', 'snapshot', 'rng_seed', 'rng_step', 'score',
+                  'coaching_points', 'downs', 'distance', 'yards_to_go', 'pressure_level', 'state_version')
+
+# Card zones persisted in the session snapshot
+SESSION_ZONES = ('deck_cards', 'hand', 'bench', 'field', 'discard_pile')
+
+# Number of past deltas kept per session for catching up stale clients
+DELTA_HISTORY = 32
+
+DELTA_INSERT = 'INSERT INTO session_deltas (session_id, version, ops) VALUES (?, ?, ?)'
+DELTA_PRUNE = 'DELETE FROM session_deltas WHERE session_id = ? AND version <= ?'
+DELTA_QUERY = 'SELECT ops FROM session_deltas WHERE session_id = ? AND version > ? AND version <= ? ORDER BY version'
+ACTION_INSERT = 'INSERT OR REPLACE INTO session_actions (session_id, rng_step, action, payload) VALUES (?, ?, ?, ?)'
+
+PROGRESS_MIGRATION_UPDATE = '''
+    UPDATE game_sessions
+    SET current_season = ?, drives_completed = ?, games_won = ?, seasons_won = ?,
+        total_drives_in_game = ?, total_games_in_season = ?, total_seasons = ?,
+        total_score = ?, championships_won = ?, super_bowls_won = ?, hall_of_fame_points = ?,
+        progress_migrated = 1
+    WHERE id = ?
+'''
+
+def load_json_column(value, column):
+    """Parse a JSON text column"""
+    with span('json.loads', column=column):
+        return json.loads(value)
+
+def dump_json_column(value, column):
+    """Serialize a value for a JSON text column"""
+    with span('json.dumps', column=column):
+        return json.dumps(value)
+
+def legacy_progress(game_progress: Optional[str], season_progress: Optional[str],
+                    career_progress: Optional[str]) -> dict:
+    """Typed progress counters of a row written before the typed columns, from its JSON progress columns"""
+    game_progress = load_json_column(game_progress or '{}', 'game_progress')
+    season_progress = load_json_column(season_progress or '{}', 'season_progress')
+    career_progress = load_json_column(career_progress or '{}', 'career_progress')
+    return {
+        'current_season': season_progress.get('current_season', 1),
+        'drives_completed': game_progress.get('drives_completed', 0),
+        'games_won': season_progress.get('games_won', game_progress.get('games_won', 0)),
+        'seasons_won': season_progress.get('seasons_won', 0),
+        'total_drives_in_game': game_progress.get('total_drives_in_game', 4),
+        'total_games_in_season': game_progress.get('total_games_in_season', 10),
+        'total_seasons': season_progress.get('total_seasons', 10),
+        'total_score': career_progress.get('total_score', 0),
+        'championships_won': career_progress.get('championships_won', 0),
+        'super_bowls_won': career_progress.get('super_bowls_won', 0),
+        'hall_of_fame_points': career_progress.get('hall_of_fame_points', 0)
+    }
+
+def progress_migration_params(row) -> tuple:
+    """PROGRESS_MIGRATION_UPDATE parameters for one legacy row of (id, game, season, career JSON)"""
+    return (*legacy_progress(*row[1:]).values(), row[0])
+
+def progress_views(progress):
+    """Render typed progress counters as the game, season and career progress API objects"""
+    game_progress = {
+        'current_game': progress['current_game'],
+        'current_drive': progress['current_drive'],
+        'drives_completed': progress['drives_completed'],
+        'games_won': progress['games_won'],
+        'total_drives_in_game': progress['total_drives_in_game'],
+        'total_games_in_season': progress['total_games_in_season']
+    }
+    season_progress = {
+        'current_season': progress['current_season'],
+        'games_won': progress['games_won'],
+        'seasons_won': progress['seasons_won'],
+        'total_games_in_season': progress['total_games_in_season'],
+        'total_seasons': progress['total_seasons']
+    }
+    career_progress = {
+        'current_level': progress['career_level'],
+        'total_score': progress['total_score'],
+        'championships_won': progress['championships_won'],
+        'super_bowls_won': progress['super_bowls_won'],
+        'hall_of_fame_points': progress['hall_of_fame_points']
+    }
+    return game_progress, season_progress, career_progress
+
+def log_delta(cursor, session_id: int, version: int, ops: Iterable[dict]):
+    """Log the ops that produced a state version, dropping deltas too old to catch a client up from"""
+    cursor.execute(DELTA_INSERT, (session_id, version, dump_json_column(list(ops), 'ops')))
+    cursor.execute(DELTA_PRUNE, (session_id, version - DELTA_HISTORY))
+
+def log_actions(cursor, session_id: int, actions: Iterable[Tuple[int, str, dict]]):
+    """Log (rng step, action, payload) entries for replay, replacing any already logged at those steps"""
+    with span('json.dumps', column='payload'):
+        rows = [(session_id, step, action, json.dumps(payload)) for step, action, payload in actions]
+    cursor.executemany(ACTION_INSERT, rows)
+
+class SessionError(Exception):
+    """A session row this repository can't load, or can't save because it changed since it was loaded"""
+
+class GameSession:
+    """One session's game state, as loaded from a repository"""
+
+    def __init__(self, session_id: Optional[int], deck: dict, progress: dict, **fields):
+        self.id = session_id
+        self.deck = deck
+        self.progress = progress
+        for field in SESSION_FIELDS:
+            setattr(self, field, fields[field])
+
+    @classmethod
+    def new(cls, player_name: str, deck: dict, deck_type: str, snapshot: bytes, rng_seed: int,
+            catalog_version: Optional[str]) -> 'GameSession':
+        """A session as start_game creates it - step 0 of the rng stream dealt the deck. Its id is assigned when
+        a repository creates it."""
+        return cls(None, deck, dict(NEW_PROGRESS), player_name=player_name, deck_type=deck_type,
+                   catalog_version=catalog_version, snapshot=snapshot, rng_seed=rng_seed, rng_step=1, score=0,
+                   coaching_points=0, downs=1, distance=0, yards_to_go=10, pressure_level=0, state_version=0)
+
+    @property
+    def situation(self) -> Tuple[int, int, int]:
+        return self.downs, self.distance, self.yards_to_go
+
+    @situation.setter
+    def situation(self, value: Tuple[int, int, int]):
+        self.downs, self.distance, self.yards_to_go = value
+
+    def fields(self) -> dict:
+        return {field: getattr(self, field) for field in SESSION_FIELDS}
+
+class SessionRepository:
+    """Creates, loads and saves whole sessions"""
+
+    def create(self, player_name: str, deck: dict, deck_type: str, snapshot: bytes, rng_seed: int,
+               catalog_version: Optional[str]) -> GameSession:
+        """Deal in a new session, as start_game does"""
+        return self.create_many([GameSession.new(player_name, deck, deck_type, snapshot, rng_seed,
+                                                 catalog_version)])[0]
+
+    def create_many(self, sessions: List[GameSession]) -> List[GameSession]:
+        """Store new sessions as they are, e.g. freshly dealt or imported, giving each its id"""
+        raise NotImplementedError
+
+    def load(self, session_id: int) -> Optional[GameSession]:
+        """The session, or None if there is no such session"""
+        raise NotImplementedError
+
+    def save(self, session: GameSession, ops: List[dict] = (), actions: List[Tuple[int, str, dict]] = ()) -> int:
+        """Write a session back, with the delta ops that changed it and (rng step, action, payload) log entries,
+        and return its new state version. Raises SessionError if it was saved by anyone else since it was loaded."""
+        raise NotImplementedError
+
+    def deltas(self, session_id: int, since: int, version: int) -> Optional[List[dict]]:
+        """The ops that took a session from state version since to version, or None if some are no longer kept"""
+        raise NotImplementedError
+
+    def season_rows(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        """(current season, sessions, games won, most games won, seasons won) of groups of sessions"""
+        raise NotImplementedError
+
+    def season_totals(self) -> List[dict]:
+        """Games and seasons won per current season across all sessions"""
+        seasons = {}
+        for season, sessions, games_won, best, seasons_won in self.season_rows():
+            totals = seasons.setdefault(season, {'season': season, 'sessions': 0, 'games_won': 0,
+                                                 'most_games_won': 0, 'seasons_won': 0})
+            totals['sessions'] += sessions
+            totals['games_won'] += games_won or 0
+            totals['most_games_won'] = max(totals['most_games_won'], best or 0)
+            totals['seasons_won'] += seasons_won or 0
+        return [seasons[season] for season in sorted(seasons)]
+
+    @contextmanager
+    def transaction(self, session_id: int) -> Iterator['SessionRepository']:
+        """A repository for loading and saving one session without anyone else saving it in between, until the
+        block exits"""
+        yield self
+
+class SQLiteSessionRepository(SessionRepository):
+    """Sessions in game_sessions rows of a ShardRouter's shards. Rows written before snapshots and typed progress
+    columns load as if they had them, and are upgraded when they are saved."""
+
+    LOAD_QUERY = (f'SELECT progress_migrated, deck, {", ".join(SESSION_FIELDS)}, {", ".join(PROGRESS_COLUMNS)} '
+                  'FROM game_sessions WHERE id = ?')
+    LEGACY_QUERY = (f'SELECT game_progress, season_progress, career_progress, {", ".join(SESSION_ZONES)} '
+                    'FROM game_sessions WHERE id = ?')
+    INSERT = f'''
+        INSERT INTO game_sessions (id, deck, {", ".join(SESSION_FIELDS)}, progress_migrated,
+                                   {", ".join(PROGRESS_COLUMNS)})
+        VALUES ({", ".join("?" for _ in range(len(SESSION_FIELDS) + len(PROGRESS_COLUMNS) + 3))})
+    '''
+    UPDATE = f'''
+        UPDATE game_sessions
+        SET {", ".join(f"{column} = ?" for column in SESSION_FIELDS + PROGRESS_COLUMNS)}, progress_migrated = 1
+        WHERE id = ? AND state_version = ?
+    '''
+    # The id AUTOINCREMENT would give the next session
+    NEXT_ID_QUERY = '''
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'game_sessions'), 0),
+                   COALESCE((SELECT MAX(id) FROM game_sessions), 0)) + 1
+    '''
+    SEASON_QUERY = '''
+        SELECT current_season, COUNT(*), SUM(games_won), MAX(games_won), SUM(seasons_won)
+        FROM game_sessions
+        GROUP BY current_season
+    '''
+    # Statements every request runs, compiled at warm-up
+    STATEMENTS = (LOAD_QUERY, UPDATE, DELTA_QUERY, DELTA_INSERT, DELTA_PRUNE, ACTION_INSERT)
+
+    def __init__(self, router: ShardRouter, conn=None):
+        self.router = router
+        # Set on the repository transaction() hands out, whose calls all run on its connection
+        self.conn = conn
+
+    @contextmanager
+    def _connect(self, session_id: int, write: bool = False):
+        """The connection for one call: the open transaction's, else a new one, which for writes commits if the
+        block succeeds"""
+        if self.conn is not None:
+            yield self.conn
+        elif write:
+            with self.router.session_transaction(session_id) as conn:
+                yield conn
+                conn.commit()
+        else:
+            conn = self.router.connect_session(session_id)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    @contextmanager
+    def transaction(self, session_id):
+        with self.router.session_transaction(session_id) as conn:
+            yield SQLiteSessionRepository(self.router, conn)
+            conn.commit()
+
+    def create_many(self, sessions):
+        shards = {}
+        for session in sessions:
+            session.id = self.router.new_session_id()
+            shards.setdefault(self.router.session_path(session.id) if session.id else self.router.shard_path(0),
+                              []).append(session)
+
+        for shard_sessions in shards.values():
+            with self.router.session_transaction(shard_sessions[0].id) as conn:
+                if shard_sessions[0].id is None:
+                    # The write lock is held, so AUTOINCREMENT ids can be handed out up front
+                    first_id = conn.execute(self.NEXT_ID_QUERY).fetchone()[0]
+                    for offset, session in enumerate(shard_sessions):
+                        session.id = first_id + offset
+                conn.executemany(self.INSERT, [
+                    (session.id, dump_json_column(session.deck, 'deck'), *session.fields().values(), 1,
+                     *(session.progress[column] for column in PROGRESS_COLUMNS))
+                    for session in shard_sessions
+                ])
+                conn.commit()
+        return sessions
+
+    def load(self, session_id):
+        with self._connect(session_id) as conn:
+            row = conn.execute(self.LOAD_QUERY, (session_id,)).fetchone()
+            if not row:
+                return None
+            fields = dict(zip(SESSION_FIELDS, row[2:len(SESSION_FIELDS) + 2]))
+            progress = dict(zip(PROGRESS_COLUMNS, row[len(SESSION_FIELDS) + 2:]))
+            if not row[0] or fields['snapshot'] is None:
+                # Written by a server that predates typed progress or snapshots
+                legacy = conn.execute(self.LEGACY_QUERY, (session_id,)).fetchone()
+                if not row[0]:
+                    progress.update(legacy_progress(*legacy[:3]))
+                if fields['snapshot'] is None:
+                    fields['snapshot'] = encode_snapshot({name: load_json_column(column, name)
+                                                          for name, column in zip(SESSION_ZONES, legacy[3:])})
+        return GameSession(session_id, load_json_column(row[1], 'deck'), progress, **fields)
+
+    def save(self, session, ops=(), actions=()):
+        fields = dict(session.fields(), state_version=session.state_version + 1)
+        with self._connect(session.id, write=True) as conn:
+            # Only over the version it was loaded at, so a write in between isn't lost
+            cursor = conn.execute(self.UPDATE, (*fields.values(),
+                                                *(session.progress[column] for column in PROGRESS_COLUMNS),
+                                                session.id, session.state_version))
+            if not cursor.rowcount:
+                raise SessionError(f'Session {session.id} changed since it was loaded')
+            log_delta(conn, session.id, fields['state_version'], ops)
+            log_actions(conn, session.id, actions)
+        session.state_version = fields['state_version']
+        return session.state_version
+
+    def deltas(self, session_id, since, version):
+        with self._connect(session_id) as conn:
+            rows = conn.execute(DELTA_QUERY, (session_id, since, version)).fetchall()
+        if len(rows) != version - since:
+            return None
+        return [op for row in rows for op in load_json_column(row[0], 'ops')]
+
+    def season_rows(self):
+        for path in self.router.shard_paths():
+            conn = storage.connect(path)
+            try:
+                yield from conn.execute(self.SEASON_QUERY).fetchall()
+            finally:
+                conn.close()
+
+class DictSessionRepository(SessionRepository):
+    """Sessions in dicts of this process. Loads hand out copies, so a session only changes when it is saved."""
+
+    def __init__(self):
+        self.sessions: Dict[int, Tuple[dict, dict, dict]] = {}  # id -> (deck, fields, progress)
+        self.deltas_by_session: Dict[int, Dict[int, List[dict]]] = {}  # id -> {version: ops}
+        self.actions: Dict[int, Dict[int, Tuple[str, dict]]] = {}  # id -> {rng step: (action, payload)}
+        self._next_id = 1
+
+    def create_many(self, sessions):
+        for session in sessions:
+            session.id = self._next_id
+            self._next_id += 1
+            self.sessions[session.id] = (copy.deepcopy(session.deck), session.fields(), dict(session.progress))
+            self.deltas_by_session[session.id] = {}
+            self.actions[session.id] = {}
+        return sessions
+
+    def load(self, session_id):
+        stored = self.sessions.get(session_id)
+        if stored is None:
+            return None
+        deck, fields, progress = stored
+        return GameSession(session_id, copy.deepcopy(deck), dict(progress), **fields)
+
+    def save(self, session, ops=(), actions=()):
+        deck, fields, _ = self.sessions[session.id]
+        if fields['state_version'] != session.state_version:
+            raise SessionError(f'Session {session.id} changed since it was loaded')
+        session.state_version += 1
+        self.sessions[session.id] = (deck, session.fields(), dict(session.progress))
+        deltas = self.deltas_by_session[session.id]
+        deltas[session.state_version] = list(ops)
+        deltas.pop(session.state_version - DELTA_HISTORY, None)
+        self.actions[session.id].update((step, (action, payload)) for step, action, payload in actions)
+        return session.state_version
+
+    def deltas(self, session_id, since, version):
+        kept = self.deltas_by_session.get(session_id, {})
+        if any(step not in kept for step in range(since + 1, version + 1)):
+            return None
+        return [op for step in range(since + 1, version + 1) for op in kept[step]]
+
+    def season_rows(self):
+        for _, _, progress in self.sessions.values():
+            yield progress['current_season'], 1, progress['games_won'], progress['games_won'], progress['seasons_won']
@@ -0,0 +1,178 @@
+"""Session storage partitioned across SQLite shard files.
+
+Card catalog tables always live in the main database file, which handlers only
+open read-only. Session tables (game_sessions, session_deltas, session_actions,
+idempotency_keys) live in shard files picked by hashing the session id, so
+writes from different players land on different SQLite locks. With a single shard the main database file is used
+for sessions too, which is the original layout.
+
+Shard paths are storage names (see storage.py), so an in-memory database gets
+in-memory shards. Rebalancing is an offline operation on shard files - stop the
+servers first:
+    python shards.py rebalance --from 2 --to 4 [--database fantasy_football.db]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import storage
+
+# Tables that hold per-session rows, and their session id column
+SESSION_TABLES = {'game_sessions': 'id', 'session_deltas': 'session_id', 'session_actions': 'session_id',
+                  'idempotency_keys': 'session_id'}
+
+# Random session ids stay below 2**53 so JavaScript clients can hold them exactly
+SESSION_ID_BITS = 48
+
+# Seconds a write connection waits for other writers to release the shard
+WRITE_TIMEOUT = 30
+
+def shard_index(session_id: int, shard_count: int) -> int:
+    """Hash a session id to its shard"""
+    return zlib.crc32(str(session_id).encode('ascii')) % shard_count
+
+class ShardRouter:
+    """Maps session ids to shard files and hands out connections"""
+
+    def __init__(self, database: str, shard_count: int = 1, factory: type = sqlite3.Connection):
+        self.database = database
+        self.shard_count = max(1, shard_count)
+        # Connection class handed out, e.g. one that traces its statements
+        self.factory = factory
+
+    def shard_path(self, index: int) -> str:
+        if self.shard_count == 1:
+            return self.database
+        base, ext = os.path.splitext(self.database)
+        return f'{base}.shard{index}{ext or ".db"}'
+
+    def shard_paths(self) -> List[str]:
+        return [self.shard_path(index) for index in range(self.shard_count)]
+
+    def session_path(self, session_id: int) -> str:
+        return self.shard_path(shard_index(session_id, self.shard_count))
+
+    def new_session_id(self) -> Optional[int]:
+        """Pick an id for a new session, or None to let AUTOINCREMENT assign one"""
+        if self.shard_count == 1:
+            return None
+        # Sharded ids must be known before the insert to pick the shard
+        return random.getrandbits(SESSION_ID_BITS) or 1
+
+    def connect_session(self, session_id: Optional[int], write: bool = False) -> sqlite3.Connection:
+        """Connect to the shard holding a session. A write connection starts with the shard's write lock held
+        (BEGIN IMMEDIATE), so a read-modify-write can't interleave with another process's; commit or close
+        it to let the next writer in."""
+        path = self.shard_path(0) if session_id is None else self.session_path(session_id)
+        if not write:
+            return storage.connect(path, factory=self.factory)
+        conn = storage.connect(path, factory=self.factory, timeout=WRITE_TIMEOUT)
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    @contextmanager
+    def session_transaction(self, session_id: Optional[int]) -> Iterator[sqlite3.Connection]:
+        """A write connection to a session's shard for a with block. Whatever the block doesn't commit is rolled
+        back when it exits, however it exits, and the connection is closed, so an error can't leave the shard
+        locked."""
+        conn = self.connect_session(session_id, write=True)
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def connect_catalog(self) -> sqlite3.Connection:
+        """Open the shared catalog database read-only"""
+        return storage.connect(self.database, read_only=True, factory=self.factory)
+
+def _table_sql(conn: sqlite3.Connection, table: str) -> Optional[str]:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row[0] if row else None
+
+def rebalance(database: str, old_count: int, new_count: int) -> dict:
+    """Move every session row from an old shard layout to a new one (offline only)"""
+    if old_count == new_count:
+        raise SystemExit('Shard count is unchanged')
+    old = ShardRouter(database, old_count)
+    new = ShardRouter(database, new_count)
+    old_paths = [path for path in old.shard_paths() if os.path.exists(path)]
+    if not old_paths:
+        raise SystemExit(f'No shards found for {database} with {old_count} shards')
+
+    # Copy the session table definitions from an existing shard
+    with sqlite3.connect(old_paths[0]) as conn:
+        schemas = {table: _table_sql(conn, table) for table in SESSION_TABLES}
+
+    # Build the new layout in temporary files so a failure leaves the old one intact
+    staging = {path: path + '.rebalance' for path in new.shard_paths()}
+    targets = {}
+    for index, path in enumerate(new.shard_paths()):
+        staged = staging[path]
+        if os.path.exists(staged):
+            os.remove(staged)
+        if path == database:
+            # A single shard means sessions go back into the main database
+            staged = database
+        conn = sqlite3.connect(staged)
+        for table, sql in schemas.items():
+            if sql and not _table_sql(conn, table):
+                conn.execute(sql)
+        targets[index] = conn
+
+    moved = {table: 0 for table in SESSION_TABLES}
+    for path in old_paths:
+        source = sqlite3.connect(path)
+        for table, id_column in SESSION_TABLES.items():
+            if not schemas[table]:
+                continue
+            cursor = source.execute(f'SELECT * FROM {table}')
+            columns = [description[0] for description in cursor.description]
+            id_position = columns.index(id_column)
+            insert = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})'
+            for row in cursor:
+                targets[shard_index(row[id_position], new_count)].execute(insert, row)
+                moved[table] += 1
+        source.close()
+
+    for conn in targets.values():
+        conn.commit()
+        conn.close()
+
+    # Retire the old layout, then move the staged shards into place
+    for path in old_paths:
+        if path == database:
+            with sqlite3.connect(database) as conn:
+                if new_count > 1:
+                    for table in SESSION_TABLES:
+                        if schemas[table]:
+                            conn.execute(f'DELETE FROM {table}')
+        else:
+            os.remove(path)
+    for path, staged in staging.items():
+        if path != database:
+            os.replace(staged, path)
+
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline session shard maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebalance_parser = subparsers.add_parser('rebalance', help='redistribute sessions to a new shard count')
+    rebalance_parser.add_argument('--database', default=os.environ.get('DATABASE_PATH', 'fantasy_football.db'))
+    rebalance_parser.add_argument('--from', dest='old_count', type=int, required=True)
+    rebalance_parser.add_argument('--to', dest='new_count', type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == 'rebalance':
+        moved = rebalance(args.database, args.old_count, args.new_count)
+        print(f"Moved {moved['game_sessions']} sessions ({moved['session_deltas']} deltas) "
+              f"from {args.old_count} to {args.new_count} shards")
+        print(f'Start servers with SESSION_SHARDS={args.new_count}')
+
+if __name__ == '__main__':
+    main()
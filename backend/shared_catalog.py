@@ -0,0 +1,215 @@
+"""Read-only catalog files that worker processes memory-map instead of each
+holding its own hydrated copy of the catalog.
+
+One file per catalog version, written once by whichever worker builds that
+version first and never modified afterwards:
+
+    header      '<4sBI'     magic, format version, meta length
+    meta        JSON        version, card count, rarity names, document offsets
+    index       '<BHBiII'   type code, catalog id, rarity, cost, offset, length
+    data        JSON card data and pre-serialized documents
+
+Index entries are sorted by (type code, catalog id) and searched in place, so
+opening a file only parses the header and meta. Card data is decoded on access
+and kept in a small per-process LRU; every worker shares the mapped pages.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+from catalog import CARD_TYPES, Catalog, intern_strings
+from snapshot import TYPE_CODES, TYPE_NAMES
+
+MAGIC = b'FFCT'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sBI')
+INDEX_ENTRY = struct.Struct('<BHBiII')
+
+# Decoded cards kept per process
+CARD_CACHE_SIZE = 256
+
+def catalog_file_path(directory: str, version: str) -> str:
+    return os.path.join(directory, f'catalog-{version}.ffcat')
+
+def write_catalog_file(catalog: Catalog, path: str, documents: Dict[str, bytes]):
+    """Serialize a catalog and its documents, replacing the file atomically"""
+    cards = [card for card_type in CARD_TYPES for card in catalog.cards_of_type(card_type)]
+    rarities = sorted({card['data']['rarity'] for card in cards})
+
+    # Lay out the data region first; offsets are made absolute once the meta size is known
+    blobs = [json.dumps(card['data']).encode('utf-8') for card in cards]
+    data_offsets = []
+    position = 0
+    for blob in blobs + list(documents.values()):
+        data_offsets.append(position)
+        position += len(blob)
+
+    def build_meta(base):
+        return json.dumps({
+            'version': catalog.version,
+            'count': len(cards),
+            'rarities': rarities,
+            'documents': {name: [base + offset, len(body)] for (name, body), offset in
+                          zip(documents.items(), data_offsets[len(cards):])},
+        }).encode('utf-8')
+
+    # Document offsets change the meta length, so settle on a stable size
+    base = 0
+    while True:
+        meta = build_meta(base)
+        new_base = HEADER.size + len(meta) + INDEX_ENTRY.size * len(cards)
+        if new_base == base:
+            break
+        base = new_base
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)))
+            f.write(meta)
+            for card, blob, offset in zip(cards, blobs, data_offsets):
+                f.write(INDEX_ENTRY.pack(TYPE_CODES[card['type']], card['id'],
+                                         rarities.index(card['data']['rarity']), card['data']['cost'],
+                                         base + offset, len(blob)))
+            for blob in blobs:
+                f.write(blob)
+            for body in documents.values():
+                f.write(body)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+class MappedCards(Mapping):
+    """(card type, catalog id) -> card, decoded from the mapped file on access"""
+
+    def __init__(self, mapped: 'MappedCatalog'):
+        self.mapped = mapped
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            card = self.cache.get(key)
+            if card is not None:
+                self.cache.move_to_end(key)
+                return card
+        entry = self.mapped.entry(*key)
+        if entry is None:
+            raise KeyError(key)
+        data = intern_strings(json.loads(self.mapped.buffer[entry[4]:entry[4] + entry[5]]))
+        card = {'id': data['id'], 'type': key[0], 'data': data, 'synergy_tags': data['synergy_tags']}
+        with self.lock:
+            self.cache[key] = card
+            while len(self.cache) > CARD_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return card
+
+    def __iter__(self):
+        for position in range(self.mapped.count):
+            code, card_id = self.mapped.raw_entry(position)[:2]
+            yield TYPE_NAMES[code], card_id
+
+    def __len__(self):
+        return self.mapped.count
+
+class MappedDocuments(Mapping):
+    """Pre-serialized documents stored in the mapped file"""
+
+    def __init__(self, mapped: 'MappedCatalog', offsets: Dict[str, List[int]]):
+        self.mapped = mapped
+        self.offsets = offsets
+
+    def __getitem__(self, name):
+        offset, length = self.offsets[name]
+        return self.mapped.buffer[offset:offset + length]
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+class MappedCatalog(Catalog):
+    """A catalog version served from a memory-mapped catalog file"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, meta_length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a catalog file this server can read')
+        meta = json.loads(self.buffer[HEADER.size:HEADER.size + meta_length])
+
+        self.path = path
+        self.version = meta['version']
+        self.count = meta['count']
+        self.rarities = meta['rarities']
+        self.index_offset = HEADER.size + meta_length
+        self.cards = MappedCards(self)
+        self.documents = MappedDocuments(self, meta['documents'])
+        self.indexes = {}
+        # Small per-process views of the index, built on first use
+        self._ids = None
+        self._rarity_codes = None
+
+    def raw_entry(self, position: int) -> Tuple[int, int, int, int, int, int]:
+        return INDEX_ENTRY.unpack_from(self.buffer, self.index_offset + position * INDEX_ENTRY.size)
+
+    def entry(self, card_type: str, card_id: int):
+        """Binary search the index for a card's entry"""
+        code = TYPE_CODES.get(card_type)
+        if code is None:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.raw_entry(middle)
+            if (entry[0], entry[1]) < (code, card_id):
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            entry = self.raw_entry(low)
+            if entry[0] == code and entry[1] == card_id:
+                return entry
+        return None
+
+    def to_wire(self) -> Dict[str, Dict[int, dict]]:
+        return {card_type: {card['id']: card['data'] for card in self.cards_of_type(card_type)}
+                for card_type in CARD_TYPES}
+
+    def get(self, card_type: str, card_id: int) -> Optional[dict]:
+        return self.cards.get((card_type, card_id))
+
+    def cards_of_type(self, card_type: str) -> List[dict]:
+        return [self.cards[(card_type, card_id)] for card_id in self.ids_of_type(card_type)]
+
+    def _scan_index(self):
+        ids = {card_type: [] for card_type in CARD_TYPES}
+        rarity_codes = {}
+        end = self.index_offset + self.count * INDEX_ENTRY.size
+        for code, card_id, rarity, _, _, _ in INDEX_ENTRY.iter_unpack(self.buffer[self.index_offset:end]):
+            ids[TYPE_NAMES[code]].append(card_id)
+            rarity_codes[(TYPE_NAMES[code], card_id)] = rarity
+        self._rarity_codes = rarity_codes
+        self._ids = ids
+
+    def ids_of_type(self, card_type: str) -> List[int]:
+        if self._ids is None:
+            self._scan_index()
+        return self._ids[card_type]
+
+    def rarity(self, card_type: str, card_id: int) -> Optional[str]:
+        if self._ids is None:
+            self._scan_index()
+        code = self._rarity_codes.get((card_type, card_id))
+        return self.rarities[code] if code is not None else None
@@ -0,0 +1,101 @@
+"""Monte Carlo drive simulations, run as background jobs (see jobs.py).
+
+Each simulation loads the catalog version it was submitted against and scores
+drives with the same calculate_drive_score the API uses, so its numbers match
+what players see. Params carry the server's database and catalog paths, filled
+in by the API rather than the client.
+"""
+import random
+from typing import List
+
+from catalog import CARD_TYPES, CatalogRegistry
+from deck import HAND_LIMIT
+from jobs import JobError
+from scoring import calculate_drive_score
+from synergy import build_synergy_matrix
+
+# Most drives one drive preview may simulate
+MAX_PREVIEW_TRIALS = 100000
+
+# Most drives a card sweep may simulate per card
+MAX_SWEEP_TRIALS = 5000
+
+def job_catalog(params: dict):
+    """The catalog version a job was submitted against, with its synergy matrix"""
+    registry = CatalogRegistry(params['catalog_path'], params['database'])
+    registry.on_build.append(build_synergy_matrix)
+    return registry.get(params.get('catalog_version'))
+
+def bounded_int(params: dict, name: str, default: int, low: int, high: int) -> int:
+    value = params.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise JobError(f'{name} must be an integer from {low} to {high}')
+    return value
+
+def job_game_state(params: dict) -> dict:
+    return {'season': bounded_int(params, 'season', 1, 1, 100), 'game': bounded_int(params, 'game', 1, 1, 100)}
+
+def outcome_summary(results: List[dict]) -> dict:
+    """Averages and rates over simulated drive results"""
+    drives = len(results)
+    return {
+        'avg_drive_score': round(sum(result['drive_score'] for result in results) / drives, 2),
+        'success_rate': round(sum(1 for result in results if result['drive_successful']) / drives, 4),
+        'turnover_rate': round(sum(1 for result in results if result['turnover']) / drives, 4),
+        'avg_yards': round(sum(result['yards_gained'] for result in results) / drives, 2),
+    }
+
+def drive_preview(params: dict) -> dict:
+    """Outcome distribution of one hand of cards over many simulated drives"""
+    catalog = job_catalog(params)
+    refs = params.get('cards')
+    if not isinstance(refs, list) or not 0 < len(refs) <= HAND_LIMIT:
+        raise JobError(f'cards must be a list of 1 to {HAND_LIMIT} card refs')
+    cards = []
+    for ref in refs:
+        card = catalog.get(ref.get('type'), ref.get('id')) if isinstance(ref, dict) else None
+        if card is None:
+            raise JobError(f'Unknown card: {ref}')
+        cards.append(card)
+    trials = bounded_int(params, 'trials', 1000, 1, MAX_PREVIEW_TRIALS)
+    game_state = job_game_state(params)
+
+    rng = random.Random(params.get('seed'))
+    synergy = catalog.indexes['synergy']
+    results = [calculate_drive_score(cards, game_state, rng, synergy) for _ in range(trials)]
+    scores = sorted(result['drive_score'] for result in results)
+    return {
+        'catalog_version': catalog.version,
+        'cards': [{'type': card['type'], 'id': card['id']} for card in cards],
+        'trials': trials,
+        **outcome_summary(results),
+        'score_percentiles': {f'p{percent}': scores[(trials - 1) * percent // 100] for percent in (10, 50, 90)},
+    }
+
+def card_sweep(params: dict) -> dict:
+    """Simulated drive outcomes of every card of one type, each played in random hands"""
+    catalog = job_catalog(params)
+    card_type = params.get('type')
+    if card_type not in CARD_TYPES:
+        raise JobError(f'type must be one of {", ".join(CARD_TYPES)}')
+    trials = bounded_int(params, 'trials', 200, 1, MAX_SWEEP_TRIALS)
+    hand_size = bounded_int(params, 'hand_size', 4, 1, HAND_LIMIT)
+    game_state = job_game_state(params)
+
+    rng = random.Random(params.get('seed'))
+    pool = [card for pool_type in CARD_TYPES for card in catalog.cards_of_type(pool_type)]
+    synergy = catalog.indexes['synergy']
+    cards = []
+    for card in catalog.cards_of_type(card_type):
+        # The rest of each hand is drawn from the whole catalog
+        results = [calculate_drive_score([card] + rng.sample(pool, hand_size - 1), game_state, rng, synergy)
+                   for _ in range(trials)]
+        cards.append({'type': card_type, 'id': card['id'], 'name': card['data']['name'], **outcome_summary(results)})
+    cards.sort(key=lambda entry: entry['avg_drive_score'], reverse=True)
+    return {
+        'catalog_version': catalog.version,
+        'type': card_type,
+        'trials': trials,
+        'hand_size': hand_size,
+        'cards': cards,
+    }
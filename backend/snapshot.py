@@ -0,0 +1,392 @@
+"""Versioned binary snapshot codec for game sessions.
+
+A snapshot replaces the JSON TEXT columns of a session with one compact blob:
+
+    header      '<4sBBB'  magic, format version, section flags, zone count
+    zone table  '<BHI'    zone code, card count, byte offset (one per zone)
+    sections    optional progress / rng / meta blocks, in flag order
+    card refs   '<BHH'    card type code, catalog id, instance id (five bytes per card)
+
+Card refs only name a catalog entry, so decoding needs a resolver that turns
+(card type, catalog id) back into the API card dict. The instance id tells
+copies of the same card apart and stays with a card as it moves between zones;
+the 'deck' zone is a deck config, not cards, and uses instance id 0. Zones are
+decoded lazily: opening a snapshot only parses the header and zone table.
+
+Version 1 card refs had no instance id ('<BH'); such snapshots are numbered in
+zone order when opened.
+"""
+import struct
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Optional
+
+MAGIC = b'FFSS'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<4sBBB')
+ZONE_ENTRY = struct.Struct('<BHI')
+CARD_REF = struct.Struct('<BHH')
+CARD_REF_V1 = struct.Struct('<BH')
+
+# Highest instance id a card ref can hold
+MAX_INSTANCE_ID = 0xFFFF
+RNG = struct.Struct('<qI')
+
+# Section flags
+FLAG_PROGRESS = 0x01
+FLAG_RNG = 0x02
+FLAG_META = 0x04
+
+TYPE_CODES = {'player': 0, 'play': 1, 'modifier': 2}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Zone codes are part of the format - append only
+ZONES = ('deck', 'deck_cards', 'hand', 'bench', 'field', 'discard_pile')
+ZONE_CODES = {name: code for code, name in enumerate(ZONES)}
+
+# Deck configs list catalog ids per card type
+DECK_CONFIG_KEYS = {'players': 'player', 'plays': 'play', 'modifiers': 'modifier'}
+
+# (section, key, struct format) for every progress counter
+PROGRESS_FIELDS = (
+    ('session', 'current_season', 'H'),
+    ('session', 'current_game', 'H'),
+    ('session', 'current_drive', 'H'),
+    ('session', 'score', 'i'),
+    ('session', 'coaching_points', 'i'),
+    ('session', 'downs', 'B'),
+    ('session', 'distance', 'h'),
+    ('session', 'yards_to_go', 'h'),
+    ('session', 'pressure_level', 'H'),
+    ('game_progress', 'current_game', 'H'),
+    ('game_progress', 'current_drive', 'H'),
+    ('game_progress', 'drives_completed', 'H'),
+    ('game_progress', 'games_won', 'H'),
+    ('game_progress', 'total_drives_in_game', 'H'),
+    ('game_progress', 'total_games_in_season', 'H'),
+    ('season_progress', 'current_season', 'H'),
+    ('season_progress', 'games_won', 'H'),
+    ('season_progress', 'seasons_won', 'H'),
+    ('season_progress', 'total_games_in_season', 'H'),
+    ('season_progress', 'total_seasons', 'H'),
+    ('career_progress', 'total_score', 'i'),
+    ('career_progress', 'championships_won', 'H'),
+    ('career_progress', 'super_bowls_won', 'H'),
+    ('career_progress', 'hall_of_fame_points', 'i'),
+)
+PROGRESS = struct.Struct('<' + ''.join(fmt for _, _, fmt in PROGRESS_FIELDS))
+
+META_FIELDS = ('player_name', 'deck_type', 'career_level')
+
+class SnapshotError(ValueError):
+    """Raised when a blob is not a snapshot this codec can read"""
+
+class CardInstance(Mapping):
+    """A card in a session: a view of its shared catalog card plus its instance id.
+
+    Reads like the API card dict ({'id', 'type', 'data', 'synergy_tags',
+    'instance_id'}) without copying the catalog card, so a hydrated zone costs
+    one small object per card. Convert with to_dict() where a real dict is
+    needed, e.g. for JSON serialization.
+    """
+    __slots__ = ('card', 'instance_id')
+
+    def __init__(self, card: dict, instance_id: int):
+        self.card = card
+        self.instance_id = instance_id
+
+    def __getitem__(self, key):
+        if key == 'instance_id':
+            return self.instance_id
+        return self.card[key]
+
+    def get(self, key, default=None):
+        if key == 'instance_id':
+            return self.instance_id
+        return self.card.get(key, default)
+
+    def __contains__(self, key):
+        return key == 'instance_id' or key in self.card
+
+    def __iter__(self):
+        yield from self.card
+        yield 'instance_id'
+
+    def __len__(self):
+        return len(self.card) + 1
+
+    def to_dict(self) -> dict:
+        return dict(self.card, instance_id=self.instance_id)
+
+def pack_refs(cards: Iterable[dict]) -> bytes:
+    """Pack API card dicts into card refs, keeping their instance ids"""
+    out = bytearray()
+    for card in cards:
+        out += CARD_REF.pack(TYPE_CODES[card['type']], card['id'], card.get('instance_id', 0))
+    return bytes(out)
+
+def unpack_refs(data: bytes) -> List[tuple]:
+    """Unpack card refs to (card type, catalog id, instance id) triples"""
+    try:
+        return [(TYPE_NAMES[code], card_id, instance_id) for code, card_id, instance_id in CARD_REF.iter_unpack(data)]
+    except KeyError as e:
+        raise SnapshotError(f'Unknown card type code {e.args[0]}')
+
+def number_cards(zones: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    """Give every card without an instance id the next free one"""
+    next_instance = 1 + max((card.get('instance_id', 0) for cards in zones.values() for card in cards), default=0)
+    numbered = {}
+    for name, cards in zones.items():
+        numbered[name] = []
+        for card in cards:
+            if not card.get('instance_id'):
+                if next_instance > MAX_INSTANCE_ID:
+                    raise SnapshotError('Session has run out of card instance ids')
+                card = dict(card, instance_id=next_instance)
+                next_instance += 1
+            numbered[name].append(card)
+    return numbered
+
+def pack_deck_config(deck_config: dict) -> bytes:
+    """Pack a deck config ({'players': [...], ...}) as card refs"""
+    out = bytearray()
+    for key, card_type in DECK_CONFIG_KEYS.items():
+        for card_id in deck_config.get(key, []):
+            out += CARD_REF.pack(TYPE_CODES[card_type], card_id, 0)
+    return bytes(out)
+
+def _pack_string(value: str) -> bytes:
+    raw = (value or '').encode('utf-8')[:255]
+    return struct.pack('<B', len(raw)) + raw
+
+def encode_packed_zones(packed_zones: Dict[str, bytes], progress: Optional[dict] = None,
+                        rng: Optional[tuple] = None, meta: Optional[dict] = None) -> bytes:
+    """Assemble a snapshot from zones that are already packed as card refs"""
+    flags = 0
+    sections = bytearray()
+    if progress is not None:
+        flags |= FLAG_PROGRESS
+        sections += PROGRESS.pack(*(progress[section][key] if section != 'session' else progress[key]
+                                    for section, key, _ in PROGRESS_FIELDS))
+    if rng is not None:
+        flags |= FLAG_RNG
+        sections += RNG.pack(*rng)
+    if meta is not None:
+        flags |= FLAG_META
+        for key in META_FIELDS:
+            sections += _pack_string(meta.get(key))
+
+    zone_names = [name for name in ZONES if name in packed_zones]
+    offset = HEADER.size + ZONE_ENTRY.size * len(zone_names) + len(sections)
+    table = bytearray()
+    for name in zone_names:
+        refs = packed_zones[name]
+        table += ZONE_ENTRY.pack(ZONE_CODES[name], len(refs) // CARD_REF.size, offset)
+        offset += len(refs)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(zone_names))
+    return b''.join([header, bytes(table), bytes(sections)] + [packed_zones[name] for name in zone_names])
+
+def encode_snapshot(zones: Dict[str, List[dict]], deck_config: Optional[dict] = None,
+                    progress: Optional[dict] = None, rng: Optional[tuple] = None,
+                    meta: Optional[dict] = None) -> bytes:
+    """Encode card zones (and optionally progress, rng state and meta) as a snapshot"""
+    packed = {name: pack_refs(cards) for name, cards in number_cards(zones).items()}
+    if deck_config is not None:
+        packed['deck'] = pack_deck_config(deck_config)
+    return encode_packed_zones(packed, progress, rng, meta)
+
+class SessionSnapshot:
+    """Read view over a snapshot blob that decodes zones on first access"""
+
+    def __init__(self, blob: bytes, resolve: Optional[Callable[[str, int], Optional[dict]]] = None):
+        self.resolve = resolve
+        self._open(blob)
+        if self.version < FORMAT_VERSION:
+            self._open(self._upgrade())
+
+    def _open(self, blob: bytes):
+        self.blob = memoryview(blob)
+        if len(blob) < HEADER.size:
+            raise SnapshotError('Snapshot is truncated')
+        magic, version, flags, zone_count = HEADER.unpack_from(self.blob, 0)
+        if magic != MAGIC:
+            raise SnapshotError('Not a session snapshot')
+        if version > FORMAT_VERSION:
+            raise SnapshotError(f'Unsupported snapshot version {version}')
+        self.version = version
+        self.flags = flags
+        ref_size = CARD_REF.size if version == FORMAT_VERSION else CARD_REF_V1.size
+
+        # Everything read later is checked against the blob's length here, so a malformed upload can only
+        # fail with a SnapshotError
+        position = HEADER.size
+        fixed_sections = (PROGRESS.size if flags & FLAG_PROGRESS else 0) + (RNG.size if flags & FLAG_RNG else 0)
+        if position + zone_count * ZONE_ENTRY.size + fixed_sections > len(blob):
+            raise SnapshotError('Snapshot is truncated')
+        self._zone_index = {}
+        for _ in range(zone_count):
+            code, count, offset = ZONE_ENTRY.unpack_from(self.blob, position)
+            if code >= len(ZONES):
+                raise SnapshotError(f'Unknown zone code {code}')
+            if offset + count * ref_size > len(blob):
+                raise SnapshotError('Snapshot is truncated')
+            self._zone_index[ZONES[code]] = (offset, count)
+            position += ZONE_ENTRY.size
+        self._sections_offset = position
+        self._decoded = {}
+        self._instances = None
+
+    def _upgrade(self) -> bytes:
+        """Re-encode a version 1 snapshot, numbering its cards in zone order"""
+        packed = {}
+        next_instance = 1
+        for name, (offset, count) in self._zone_index.items():
+            out = bytearray()
+            for code, card_id in CARD_REF_V1.iter_unpack(self.blob[offset:offset + count * CARD_REF_V1.size]):
+                if name == 'deck':
+                    out += CARD_REF.pack(code, card_id, 0)
+                else:
+                    out += CARD_REF.pack(code, card_id, next_instance)
+                    next_instance += 1
+            packed[name] = bytes(out)
+        return encode_packed_zones(packed, self.progress(), self.rng(), self.meta())
+
+    @property
+    def zone_names(self) -> List[str]:
+        return list(self._zone_index)
+
+    def zone_size(self, name: str) -> int:
+        """Number of cards in a zone without decoding it"""
+        return self._zone_index.get(name, (0, 0))[1]
+
+    def raw_zone(self, name: str) -> bytes:
+        """Packed card refs of a zone, for copying into a new snapshot untouched"""
+        offset, count = self._zone_index.get(name, (0, 0))
+        return bytes(self.blob[offset:offset + count * CARD_REF.size])
+
+    def refs(self, name: str) -> List[tuple]:
+        """Decode a zone to (card type, catalog id) pairs"""
+        return [(card_type, card_id) for card_type, card_id, _ in unpack_refs(self.raw_zone(name))]
+
+    def zone(self, name: str) -> List[CardInstance]:
+        """Decode and hydrate a zone to cards"""
+        if name not in self._decoded:
+            self._decoded[name] = self.hydrate(unpack_refs(self.raw_zone(name)))
+        return self._decoded[name]
+
+    def hydrate(self, refs: Iterable[tuple]) -> List[CardInstance]:
+        """Resolve (card type, catalog id, instance id) triples to cards"""
+        cards = []
+        for card_type, card_id, instance_id in refs:
+            card = self.resolve(card_type, card_id)
+            if card is None:
+                raise SnapshotError(f'Unknown card {card_type} {card_id}')
+            cards.append(CardInstance(card, instance_id))
+        return cards
+
+    def instance_index(self) -> Dict[int, tuple]:
+        """Map each card's instance id to its (zone, position), built on first use"""
+        if self._instances is None:
+            self._instances = {}
+            for name, (offset, count) in self._zone_index.items():
+                if name == 'deck':
+                    continue
+                data = self.blob[offset:offset + count * CARD_REF.size]
+                for position, (_, _, instance_id) in enumerate(CARD_REF.iter_unpack(data)):
+                    self._instances[instance_id] = (name, position)
+        return self._instances
+
+    def check_instance_ids(self):
+        """Raise SnapshotError unless every card outside the deck config has an instance id of its own, which
+        selling and drawing rely on to tell copies apart"""
+        seen = set()
+        for name, (offset, count) in self._zone_index.items():
+            if name == 'deck':
+                continue
+            for _, _, instance_id in CARD_REF.iter_unpack(self.blob[offset:offset + count * CARD_REF.size]):
+                if not instance_id:
+                    raise SnapshotError(f'A card in {name} has no instance id')
+                if instance_id in seen:
+                    raise SnapshotError(f'Instance id {instance_id} is used by more than one card')
+                seen.add(instance_id)
+
+    def next_instance_id(self, count: int = 1) -> int:
+        """First of count unused instance ids for new cards"""
+        first = max(self.instance_index(), default=0) + 1
+        if first + count - 1 > MAX_INSTANCE_ID:
+            raise SnapshotError('Session has run out of card instance ids')
+        return first
+
+    def deck_config(self) -> dict:
+        """Decode the 'deck' zone back into a deck config"""
+        config = {key: [] for key in DECK_CONFIG_KEYS}
+        keys = {card_type: key for key, card_type in DECK_CONFIG_KEYS.items()}
+        for card_type, card_id in self.refs('deck'):
+            config[keys[card_type]].append(card_id)
+        return config
+
+    def _section(self, flag: int) -> Optional[int]:
+        if not self.flags & flag:
+            return None
+        position = self._sections_offset
+        if flag == FLAG_PROGRESS:
+            return position
+        if self.flags & FLAG_PROGRESS:
+            position += PROGRESS.size
+        if flag == FLAG_RNG:
+            return position
+        if self.flags & FLAG_RNG:
+            position += RNG.size
+        return position
+
+    def progress(self) -> Optional[dict]:
+        """Decode the progress section into the session/progress dict layout"""
+        position = self._section(FLAG_PROGRESS)
+        if position is None:
+            return None
+        progress = {'game_progress': {}, 'season_progress': {}, 'career_progress': {}}
+        values = PROGRESS.unpack_from(self.blob, position)
+        for (section, key, _), value in zip(PROGRESS_FIELDS, values):
+            if section == 'session':
+                progress[key] = value
+            else:
+                progress[section][key] = value
+        return progress
+
+    def rng(self) -> Optional[tuple]:
+        """Decode the (seed, step) rng state"""
+        position = self._section(FLAG_RNG)
+        if position is None:
+            return None
+        return RNG.unpack_from(self.blob, position)
+
+    def meta(self) -> Optional[dict]:
+        """Decode player name, deck type and career level"""
+        position = self._section(FLAG_META)
+        if position is None:
+            return None
+        meta = {}
+        for key in META_FIELDS:
+            if position >= len(self.blob) or position + 1 + self.blob[position] > len(self.blob):
+                raise SnapshotError('Snapshot is truncated')
+            length = self.blob[position]
+            try:
+                meta[key] = bytes(self.blob[position + 1:position + 1 + length]).decode('utf-8')
+            except UnicodeDecodeError:
+                raise SnapshotError(f'Snapshot {key} is not valid UTF-8')
+            position += 1 + length
+        return meta
+
+    def replace_zones(self, **zones: List[dict]) -> bytes:
+        """Re-encode with some zones replaced, copying every other zone's refs as-is"""
+        packed = {name: self.raw_zone(name) for name in self._zone_index}
+        for name, cards in zones.items():
+            packed[name] = pack_refs(cards)
+        return encode_packed_zones(packed, self.progress(), self.rng(), self.meta())
+
+    def replace_packed(self, **zones: bytes) -> bytes:
+        """Re-encode with some zones replaced by already packed card refs"""
+        packed = {name: self.raw_zone(name) for name in self._zone_index}
+        packed.update(zones)
+        return encode_packed_zones(packed, self.progress(), self.rng(), self.meta())
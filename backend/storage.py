@@ -0,0 +1,85 @@
+"""Where the game's SQLite databases live.
+
+Every database is opened by name through connect(), which hands the name to a
+storage backend:
+
+    FileStorage     the name is a file path - the default
+    MemoryStorage   the name follows "memory:" and is a shared-cache in-memory
+                    database, kept alive until it is dropped or the process exits
+
+So DATABASE_PATH=memory:fantasy_football runs the whole server without touching
+disk, shards included (each shard is its own in-memory database), which makes it
+cheap to spin up isolated instances for tests, simulations and benchmarks. An
+in-memory database is only visible to the process that created it: background
+jobs run in child processes and find it empty, and connections share one
+table-level lock instead of waiting on SQLite's busy timeout, so it is not meant
+for a threaded production server.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Tuple
+from urllib.parse import quote
+from urllib.request import pathname2url
+
+MEMORY_PREFIX = 'memory:'
+
+class FileStorage:
+    """Databases in files, by path"""
+
+    def connect(self, name: str, read_only: bool = False, **kwargs) -> sqlite3.Connection:
+        if read_only:
+            return sqlite3.connect(f'file:{pathname2url(os.path.abspath(name))}?mode=ro', uri=True, **kwargs)
+        return sqlite3.connect(name, **kwargs)
+
+class MemoryStorage:
+    """Shared-cache in-memory databases, by name. SQLite frees a shared in-memory database when its last
+    connection closes, so the first connect opens one more that holds it open until drop()."""
+
+    def __init__(self):
+        self._keepers: Dict[str, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def uri(name: str) -> str:
+        return f'file:{quote(name, safe="")}?mode=memory&cache=shared'
+
+    def connect(self, name: str, read_only: bool = False, **kwargs) -> sqlite3.Connection:
+        with self._lock:
+            if name not in self._keepers:
+                self._keepers[name] = sqlite3.connect(self.uri(name), uri=True, check_same_thread=False)
+        conn = sqlite3.connect(self.uri(name), uri=True, **kwargs)
+        if read_only:
+            # mode=ro can't open an in-memory database, so refuse writes on the connection instead
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def drop(self, name: str):
+        """Free an in-memory database once every other connection to it is closed"""
+        with self._lock:
+            keeper = self._keepers.pop(name, None)
+        if keeper is not None:
+            keeper.close()
+
+file_storage = FileStorage()
+memory_storage = MemoryStorage()
+
+def resolve(database: str) -> Tuple[object, str]:
+    """The backend a database name belongs to, and its name within that backend"""
+    if database.startswith(MEMORY_PREFIX):
+        return memory_storage, database[len(MEMORY_PREFIX):]
+    return file_storage, database
+
+def connect(database: str, read_only: bool = False, **kwargs) -> sqlite3.Connection:
+    """Open a database by name, like sqlite3.connect (kwargs are passed on), on whichever backend holds it"""
+    storage, name = resolve(database)
+    return storage.connect(name, read_only, **kwargs)
+
+def drop(database: str):
+    """Free an in-memory database; database files are left alone"""
+    storage, name = resolve(database)
+    if storage is memory_storage:
+        memory_storage.drop(name)
+
+def in_memory(database: str) -> bool:
+    return resolve(database)[0] is memory_storage
@@ -0,0 +1,135 @@
+"""Pairwise synergy between every two cards of one catalog version.
+
+A card's synergy bonus (scoring.calculate_synergy_bonus) depends only on static
+card data: the synergy tags it shares with each card played before it, the QB,
+WR and RB players backing a passing or rushing play, and its rarity. A
+SynergyMatrix works this out once per catalog version (see
+CatalogRegistry.on_build) as NumPy arrays indexed by card position, in the same
+type-then-id order as the search index. Scoring then looks pairs up instead of
+intersecting tag sets on every play, and partner queries rank every card at
+once.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from catalog import CARD_TYPES, Catalog
+
+# Multiplier bonus per synergy tag shared with an earlier card, as in calculate_synergy_bonus
+TAG_BONUS = 0.1
+
+# Multiplier bonus a play gets per player of a position in the drive, by play type, in the order
+# calculate_synergy_bonus adds them
+POSITION_BONUSES = (('passing', 'QB', 0.2), ('passing', 'WR', 0.15), ('rushing', 'RB', 0.2))
+
+RARITY_BONUSES = {'epic': 0.3, 'legendary': 0.5}
+
+def synergy_key(card) -> tuple:
+    """The card data calculate_synergy_bonus reads, besides its synergy tags"""
+    data = card.get('data', {})
+    return data.get('position'), data.get('play_type'), data.get('rarity', 'common')
+
+class SynergyMatrix:
+    """Shared tag counts and pair bonuses between every two cards of one catalog version"""
+
+    def __init__(self, catalog: Catalog):
+        self.version = catalog.version
+        by_type = {card_type: catalog.cards_of_type(card_type) for card_type in CARD_TYPES}
+        cards = [card for card_type in CARD_TYPES for card in by_type[card_type]]
+        self.refs: List[Tuple[str, int]] = [(card['type'], card['id']) for card in cards]
+        self.positions = {ref: position for position, ref in enumerate(self.refs)}
+        self.tags = [card['synergy_tags'] for card in cards]
+        self.keys = [synergy_key(card) for card in cards]
+        self.tagged_list = [bool(card['synergy_tags']) for card in cards]
+        self.tagged = np.array(self.tagged_list, dtype=bool)
+        self.player_positions = [card['data'].get('position') if card['type'] == 'player' else None for card in cards]
+        self.play_types = [card['data'].get('play_type') if card['type'] == 'play' else None for card in cards]
+        self.rarity_bonuses = [RARITY_BONUSES.get(card['data'].get('rarity', 'common')) for card in cards]
+
+        tags = {tag: column for column, tag in enumerate(sorted({tag for card in cards
+                                                                  for tag in card['synergy_tags'] or ()}))}
+        incidence = np.zeros((len(cards), len(tags)), dtype=np.uint16)
+        for row, card in enumerate(cards):
+            incidence[row, [tags[tag] for tag in set(card['synergy_tags'] or ())]] = 1
+        # shared_tags[i, j]: tags card i shares with card j, zero for cards without tags (they get no bonus)
+        self.shared_tags = incidence @ incidence.T
+        self.shared_tags[~self.tagged] = 0
+
+        # pair_bonus[i, j]: multiplier bonus card i gets from card j being played before it
+        self.pair_bonus = self.shared_tags.astype(np.float32) * np.float32(TAG_BONUS)
+        play_types = np.array(self.play_types, dtype=object)
+        player_positions = np.array(self.player_positions, dtype=object)
+        for play_type, position, weight in POSITION_BONUSES:
+            rows = self.tagged & (play_types == play_type)
+            columns = player_positions == position
+            self.pair_bonus[np.ix_(rows, columns)] += np.float32(weight)
+
+        # Each type's cards are one contiguous run of positions
+        self.type_ranges = {}
+        start = 0
+        for card_type in CARD_TYPES:
+            self.type_ranges[card_type] = (start, start + len(by_type[card_type]))
+            start += len(by_type[card_type])
+
+    def drive_positions(self, cards) -> Optional[List[int]]:
+        """Matrix positions of a drive's cards, or None if any card is unknown or was sent with data
+        that differs from this catalog version's"""
+        positions = []
+        for card in cards:
+            try:
+                position = self.positions.get((card.get('type'), card.get('id')))
+            except TypeError:
+                # An unhashable id
+                return None
+            if (position is None or card.get('synergy_tags') != self.tags[position]
+                    or synergy_key(card) != self.keys[position]):
+                return None
+            positions.append(position)
+        return positions
+
+    def bonus(self, positions: List[int], index: int) -> float:
+        """calculate_synergy_bonus of the card at index of a drive, from the drive's matrix positions.
+        The terms are added in the same order, so the result is the same float."""
+        card = positions[index]
+        bonus = 0.0
+        if not self.tagged_list[card]:
+            return bonus
+
+        earlier = positions[:index]
+        shared_tags = self.shared_tags[card]
+        for other in earlier:
+            shared = shared_tags.item(other)
+            if shared:
+                bonus += shared * TAG_BONUS
+
+        play_type = self.play_types[card]
+        if play_type is not None:
+            player_positions = [self.player_positions[other] for other in earlier]
+            for bonus_type, position, weight in POSITION_BONUSES:
+                if play_type == bonus_type:
+                    count = player_positions.count(position)
+                    if count > 0:
+                        bonus += weight * count
+
+        rarity_bonus = self.rarity_bonuses[card]
+        if rarity_bonus is not None:
+            bonus += rarity_bonus
+        return bonus
+
+    def best_partners(self, position: int, limit: int,
+                      card_type: Optional[str] = None) -> List[Tuple[int, float, bool]]:
+        """The cards that give the highest pair bonus with the card at position, played in whichever order
+        is better, as (position, bonus, partner played first)"""
+        start, end = self.type_ranges[card_type] if card_type else (0, len(self.refs))
+        before = self.pair_bonus[position, start:end]
+        after = self.pair_bonus[start:end, position]
+        scores = np.maximum(before, after)
+        if start <= position < end:
+            scores[position - start] = 0
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(start + int(column), float(scores[column]), bool(before[column] >= after[column]))
+                for column in order if scores[column] > 0]
+
+def build_synergy_matrix(catalog: Catalog):
+    """CatalogRegistry build hook - precompute each catalog version's synergy matrix as it is built"""
+    catalog.indexes['synergy'] = SynergyMatrix(catalog)
@@ -0,0 +1,398 @@
+"""Lightweight request tracing, exported as OpenTelemetry JSON lines.
+
+A sampled request gets a trace: a root span for the request and child spans
+for its phases - JSON body parsing, each SQL statement, decoding stored JSON
+and snapshots, drive scoring, and serializing the response. When the request
+ends, the trace is appended to a rotating file of this process as one line in
+the OTLP/JSON trace format (what the OpenTelemetry Collector's file exporter writes and its
+otlpjsonfile receiver reads). Requests that aren't sampled only pay for a
+context variable lookup per span.
+
+Each worker process writes and rotates its own file, traces.<pid>.jsonl next to
+the configured traces.jsonl, since a rotating file can't be shared between
+processes. The summary reads them all.
+
+Sampling is decided when the request starts: a W3C traceparent header from the
+client is followed, otherwise sample_rate of the requests are traced.
+
+    python tracing.py summary [--file traces.jsonl] [--top 5] [--endpoint "POST /api/game/<int:session_id>/play-drive"]
+
+prints, per endpoint, request latency percentiles and the slowest span names.
+"""
+import argparse
+import contextvars
+import glob
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from flask import Flask, request
+from flask.json.provider import DefaultJSONProvider
+
+# Span kinds, as numbered by OTLP
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+# Span status codes, as numbered by OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SERVICE_NAME = 'fantasy-football-backend'
+
+# Longest SQL statement text kept on a span
+MAX_STATEMENT_LENGTH = 300
+
+# Table a statement reads or writes
+SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?)\s+(\w+)', re.IGNORECASE)
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_trace = contextvars.ContextVar('trace', default=None)
+_ids = random.Random()
+
+class Trace:
+    """The spans recorded for one sampled request"""
+
+    def __init__(self, tracer: 'Tracer', trace_id: str):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        # [name, span id, parent span id, kind, start wall ns, start perf ns, end perf ns, attributes, status]
+        self.spans = []
+        self.stack = []
+
+class Span:
+    """Context manager timing one phase of the current trace"""
+
+    def __init__(self, trace: Trace, name: str, kind: int, attributes: dict):
+        self.trace = trace
+        self.record = [name, f'{_ids.getrandbits(64):016x}', None, kind, 0, 0, 0, attributes, STATUS_OK]
+
+    def __enter__(self):
+        record = self.record
+        record[2] = self.trace.stack[-1][1] if self.trace.stack else None
+        self.trace.stack.append(record)
+        record[4] = time.time_ns()
+        record[5] = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = self.record
+        record[6] = time.perf_counter_ns()
+        if exc_type is not None:
+            record[7]['exception.type'] = exc_type.__name__
+            record[8] = STATUS_ERROR
+        self.trace.stack.pop()
+        self.trace.spans.append(record)
+        return False
+
+    def set(self, **attributes):
+        self.record[7].update(attributes)
+
+class _NoSpan:
+    """Stands in for a span when the request isn't traced"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+NO_SPAN = _NoSpan()
+
+def span(name: str, kind: int = INTERNAL, **attributes):
+    """Time a phase of the current request, if it is being traced"""
+    trace = _trace.get()
+    if trace is None:
+        return NO_SPAN
+    return Span(trace, name, kind, attributes)
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def otlp_span(trace_id: str, record: list) -> dict:
+    name, span_id, parent_id, kind, start, perf_start, perf_end, attributes, status = record
+    otlp = {
+        'traceId': trace_id,
+        'spanId': span_id,
+        'name': name,
+        'kind': kind,
+        'startTimeUnixNano': str(start),
+        'endTimeUnixNano': str(start + perf_end - perf_start),
+        'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in attributes.items()],
+        'status': {'code': status},
+    }
+    if parent_id:
+        otlp['parentSpanId'] = parent_id
+    return otlp
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that records a span for each statement it runs"""
+
+    def execute(self, sql, parameters=()):
+        if _trace.get() is None:
+            return super().execute(sql, parameters)
+        name, attributes = statement_span(sql)
+        with span(name, CLIENT, **attributes):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _trace.get() is None:
+            return super().executemany(sql, seq_of_parameters)
+        name, attributes = statement_span(sql)
+        with span(name, CLIENT, **attributes) as traced:
+            result = super().executemany(sql, seq_of_parameters)
+            traced.set(**{'db.rows': self.rowcount})
+            return result
+
+class TracedConnection(sqlite3.Connection):
+    """Connection factory whose statements are traced, including Connection.execute shortcuts"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+@lru_cache(maxsize=512)
+def statement_span(sql: str) -> tuple:
+    """Span name ('<operation> <table>') and attributes for a SQL statement"""
+    text = ' '.join(sql.split())
+    match = SQL_TABLE.search(text)
+    operation = text.split(' ', 1)[0].upper()
+    attributes = {'db.system': 'sqlite', 'db.operation': operation, 'db.statement': text[:MAX_STATEMENT_LENGTH]}
+    if match:
+        attributes['db.sql.table'] = match[1]
+    return (f'{operation} {match[1]}' if match else operation), attributes
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider with spans around request body parsing and response serialization"""
+
+    def loads(self, s, **kwargs):
+        with span('request.json', size=len(s)):
+            return super().loads(s, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        with span('json.dumps') as traced:
+            body = super().dumps(obj, **kwargs)
+            traced.set(size=len(body))
+            return body
+
+    def response(self, *args, **kwargs):
+        with span('jsonify'):
+            return super().response(*args, **kwargs)
+
+class Tracer:
+    """Samples requests of a Flask app and writes their traces to a rotating file"""
+
+    def __init__(self, path: str, sample_rate: float = 0.0, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._exporter = None
+
+    def init_app(self, app: Flask):
+        app.json = TracedJSONProvider(app)
+        app.before_request(self._start)
+        app.after_request(self._record_response)
+        app.teardown_request(self._finish)
+
+    def _sampled(self) -> Optional[tuple]:
+        """(trace id, parent span id) if this request is to be traced"""
+        match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+        if match:
+            # Follow the caller's sampling decision
+            return (match[1], match[2]) if int(match[3], 16) & 1 else None
+        if self.sample_rate and _ids.random() < self.sample_rate:
+            return f'{_ids.getrandbits(128):032x}', None
+        return None
+
+    def _start(self):
+        sampled = self._sampled()
+        if sampled is None:
+            return
+        trace = Trace(self, sampled[0])
+        rule = request.url_rule.rule if request.url_rule else request.path
+        root = Span(trace, f'{request.method} {rule}', SERVER, {
+            'http.request.method': request.method,
+            'http.route': rule,
+            'url.path': request.path,
+        })
+        root.__enter__()
+        root.record[2] = sampled[1]
+        request.environ['tracing.root'] = (root, _trace.set(trace))
+
+    def _record_response(self, response):
+        started = request.environ.get('tracing.root')
+        if started:
+            started[0].set(**{'http.response.status_code': response.status_code})
+            if response.status_code >= 500:
+                started[0].record[8] = STATUS_ERROR
+        return response
+
+    def _finish(self, exc):
+        started = request.environ.pop('tracing.root', None)
+        if not started:
+            return
+        root, token = started
+        trace = root.trace
+        if exc is not None:
+            root.__exit__(type(exc), exc, None)
+        else:
+            root.__exit__(None, None, None)
+        _trace.reset(token)
+        try:
+            self.export(trace)
+        except OSError:
+            logging.getLogger(__name__).exception('Could not write trace')
+
+    def export(self, trace: Trace):
+        """Append a finished trace to the trace file as one OTLP/JSON line"""
+        if self._exporter is None or self._exporter[0] != os.getpid():
+            # Created in the process that exports, after any fork of the server
+            self._exporter = (os.getpid(), trace_logger(process_trace_path(self.path, os.getpid()), self.max_bytes,
+                                                        self.backups))
+        self._exporter[1].info(json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+                                        {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [otlp_span(trace.trace_id, record) for record in trace.spans],
+            }],
+        }]}, separators=(',', ':')))
+
+def process_trace_path(path: str, pid: int) -> str:
+    """The trace file one process writes, e.g. traces.1234.jsonl for traces.jsonl"""
+    base, ext = os.path.splitext(path)
+    return f'{base}.{pid}{ext}'
+
+def trace_logger(path: str, max_bytes: int, backups: int) -> logging.Logger:
+    """A logger writing bare lines to a rotating file. The handler locks between threads only, so the file
+    must belong to one process."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    exporter = logging.getLogger(f'{__name__}.export.{os.getpid()}')
+    exporter.propagate = False
+    exporter.setLevel(logging.INFO)
+    for handler in exporter.handlers[:]:
+        exporter.removeHandler(handler)
+        handler.close()
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    exporter.addHandler(handler)
+    return exporter
+
+def read_spans(path: str) -> List[dict]:
+    """Every span in every process's trace file for path, their rotated backups, and path itself"""
+    base, ext = os.path.splitext(path)
+    per_process = f'{glob.escape(base)}.*{glob.escape(ext)}'
+    names = set(glob.glob(per_process) + glob.glob(f'{per_process}.*') + glob.glob(f'{glob.escape(path)}.*') + [path])
+    spans = []
+    for name in sorted(names):
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    export = json.loads(line)
+                except ValueError:
+                    continue
+                for resource in export.get('resourceSpans', ()):
+                    for scope in resource.get('scopeSpans', ()):
+                        spans.extend(scope.get('spans', ()))
+    return spans
+
+def summarize(spans: List[dict], top: int = 5) -> Dict[str, dict]:
+    """Per endpoint (root span name): request latencies and the span names taking the longest"""
+    def duration_ms(otlp):
+        return (int(otlp['endTimeUnixNano']) - int(otlp['startTimeUnixNano'])) / 1e6
+
+    # A client's traceparent can put several requests in one trace, so each span is attributed to the
+    # request span above it, following parentSpanId
+    by_id = {(otlp['traceId'], otlp.get('spanId')): otlp for otlp in spans}
+    roots = {}
+
+    def request_root(otlp):
+        key = (otlp['traceId'], otlp.get('spanId'))
+        if key not in roots:
+            roots[key] = None
+            if otlp.get('kind') == SERVER:
+                roots[key] = otlp
+            else:
+                parent = by_id.get((otlp['traceId'], otlp.get('parentSpanId')))
+                roots[key] = request_root(parent) if parent is not None else None
+        return roots[key]
+
+    requests = defaultdict(list)
+    phases = defaultdict(lambda: defaultdict(list))
+    for otlp in spans:
+        root = request_root(otlp)
+        if root is None:
+            continue
+        if otlp is root:
+            requests[root['name']].append(duration_ms(otlp))
+        else:
+            phases[root['name']][otlp['name']].append(duration_ms(otlp))
+
+    summary = {}
+    for endpoint, latencies in requests.items():
+        latencies.sort()
+        slowest = sorted(phases[endpoint].items(), key=lambda item: max(item[1]), reverse=True)[:top]
+        summary[endpoint] = {
+            'requests': len(latencies),
+            'p50_ms': latencies[len(latencies) // 2],
+            'p95_ms': latencies[min(len(latencies) - 1, len(latencies) * 95 // 100)],
+            'max_ms': latencies[-1],
+            'spans': [{
+                'name': name,
+                'count': len(durations),
+                'total_ms': sum(durations),
+                'max_ms': max(durations),
+            } for name, durations in slowest],
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize request traces')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary_parser = subparsers.add_parser('summary', help='slowest spans per endpoint')
+    summary_parser.add_argument('--file', default=os.environ.get('TRACE_FILE', 'traces.jsonl'))
+    summary_parser.add_argument('--top', type=int, default=5, help='span names listed per endpoint')
+    summary_parser.add_argument('--endpoint', help='only this endpoint, e.g. "GET /api/ready"')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        summary = summarize(read_spans(args.file), args.top)
+        if not summary:
+            print(f'No traces in {args.file}')
+        for endpoint, entry in sorted(summary.items(), key=lambda item: item[1]['max_ms'], reverse=True):
+            if args.endpoint and endpoint != args.endpoint:
+                continue
+            print(f"{endpoint}: {entry['requests']} requests, p50 {entry['p50_ms']:.2f} ms, "
+                  f"p95 {entry['p95_ms']:.2f} ms, max {entry['max_ms']:.2f} ms")
+            for phase in entry['spans']:
+                print(f"    {phase['name']:<24} x{phase['count']:<6} max {phase['max_ms']:8.2f} ms  "
+                      f"total {phase['total_ms']:9.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,7 @@ export interface Card {
   id: number;
   type: 'player' | 'play' | 'modifier';
   data: Player | Play | Modifier;
+  instance_id?: number; // set on cards in a session, tells copies apart
   synergy_tags?: string[];
   multiplier_effect?: number;
   combo_trigger?: ComboCondition;